@@ -0,0 +1,177 @@
+"""Parsers for the text output of SLURM commands."""
+
+import functools
+import json
+import logging
+import re
+from collections.abc import Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_squeue_output(output: str) -> list[dict[str, str]]:
+    """Parses the table printed by `squeue` into one dict per job, keyed by column name.
+
+    The parsed results are cached (by output), so the returned list should not be modified.
+    """
+    lines = [line for line in output.splitlines() if line.strip()]
+    if not lines:
+        return []
+    header, *rows = lines
+    columns = header.split()
+
+    # With the default format, the columns are padded and right-aligned, so the values of a column
+    # end where the column name ends. This also works when values contain spaces (e.g. the job
+    # name, or the reason in `NODELIST(REASON)`).
+    ends: list[int] = []
+    position = 0
+    for column in columns:
+        position = header.index(column, position) + len(column)
+        ends.append(position)
+    boundaries = ends[:-1]
+
+    def _is_aligned(row: str) -> bool:
+        return all(end >= len(row) or row[end] == " " for end in boundaries)
+
+    if not all(_is_aligned(row) for row in rows):
+        # Not padded (e.g. a custom `--format` without widths): split on whitespace instead.
+        return [dict(zip(columns, row.split(maxsplit=len(columns) - 1))) for row in rows]
+
+    jobs = []
+    for row in rows:
+        starts = [0, *boundaries]
+        stops = [*boundaries, len(row)]
+        jobs.append(
+            {
+                column: row[start:stop].strip()
+                for column, start, stop in zip(columns, starts, stops)
+            }
+        )
+    return jobs
+
+
+SQUEUE_STATE_CODES = {
+    "BF": "BOOT_FAIL",
+    "CA": "CANCELLED",
+    "CD": "COMPLETED",
+    "CF": "CONFIGURING",
+    "CG": "COMPLETING",
+    "DL": "DEADLINE",
+    "F": "FAILED",
+    "NF": "NODE_FAIL",
+    "OOM": "OUT_OF_MEMORY",
+    "PD": "PENDING",
+    "PR": "PREEMPTED",
+    "R": "RUNNING",
+    "RD": "RESV_DEL_HOLD",
+    "RF": "REQUEUE_FED",
+    "RH": "REQUEUE_HOLD",
+    "RQ": "REQUEUED",
+    "RS": "RESIZING",
+    "RV": "REVOKED",
+    "SE": "SPECIAL_EXIT",
+    "SI": "SIGNALING",
+    "SO": "STAGE_OUT",
+    "ST": "STOPPED",
+    "S": "SUSPENDED",
+    "TO": "TIMEOUT",
+}
+"""Full name of the job states, from their compact form (the `ST` column of `squeue`)."""
+
+
+def job_state(job: dict[str, str]) -> str | None:
+    """Returns the full state of a job parsed from `squeue`, from its `STATE` or `ST` column."""
+    if "STATE" in job:
+        return job["STATE"]
+    if "ST" in job:
+        return SQUEUE_STATE_CODES.get(job["ST"], job["ST"])
+    return None
+
+
+def job_states_from_squeue_output(output: str) -> dict[str, str]:
+    """Returns the state of each job in a `squeue` output, by job id."""
+    return {
+        job["JOBID"]: state
+        for job in parse_squeue_output(output)
+        if "JOBID" in job and (state := job_state(job)) is not None
+    }
+
+
+def parse_job_states_output(output: str) -> dict[str, str]:
+    """Returns the state of each job in the output of `squeue --noheader --format=%i,%T`."""
+    job_states = {}
+    for line in output.splitlines():
+        job_id, separator, state = line.strip().partition(",")
+        if separator:
+            job_states[job_id] = state
+    return job_states
+
+
+_SCONTROL_KEY = re.compile(r"(?:^|\s)([^\s=]+)=")
+"""Start of a `Key=` field in the output of `scontrol show`, at the start of a word."""
+
+
+def parse_scontrol_output(output: str) -> list[dict[str, str]]:
+    """Parses the `Key=Value` records printed by `scontrol show ...` (one dict per record).
+
+    Records are separated by blank lines. Values go until the next `Key=`, so they can contain
+    spaces (for example in `Reason=Some reason`).
+    """
+    records: list[dict[str, str]] = []
+    record: dict[str, str] = {}
+    key = None
+    for line in output.splitlines():
+        if not line.strip():
+            if record:
+                records.append(record)
+            record = {}
+            key = None
+            continue
+        matches = list(_SCONTROL_KEY.finditer(line))
+        # Text before the first key of a line is the continuation of the previous value.
+        prefix = line[: matches[0].start() if matches else len(line)].strip()
+        if prefix and key is not None:
+            record[key] += " " + prefix
+        for match, next_match in zip(matches, [*matches[1:], None]):
+            key = match.group(1)
+            record[key] = line[match.end() : next_match.start() if next_match else None].strip()
+    if record:
+        records.append(record)
+    return records
+
+
+def parse_sacct_parsable_output(output: str, fields: Sequence[str]) -> list[dict[str, str]]:
+    """Parses the output of `sacct --parsable2 --noheader --format=<fields>` (one dict per row).
+
+    The values are separated by `|`, so there are no column widths to take into account. Rows with
+    the wrong number of values (when a value contains a `|`, for example a job name) can't be split
+    reliably, so they are skipped, with a warning.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line:
+            continue
+        values = line.split("|")
+        if len(values) != len(fields):
+            logger.warning(
+                "Skipping sacct row with %d fields instead of %d: %r",
+                len(values),
+                len(fields),
+                line,
+            )
+            continue
+        rows.append(dict(zip(fields, values)))
+    return rows
+
+
+def compact_json(output: str) -> str:
+    """Re-serializes the (indented) JSON output of a SLURM command without any whitespace.
+
+    `squeue --json` and `sacct --json` pretty-print their output, and the indentation alone is
+    often a third of its size. The output is returned as-is if it isn't valid JSON.
+    """
+    try:
+        return json.dumps(json.loads(output), separators=(",", ":"))
+    except json.JSONDecodeError:
+        return output
@@ -0,0 +1,132 @@
+from slurm_mcp.parsing import (
+    compact_json,
+    job_states_from_squeue_output,
+    parse_job_states_output,
+    parse_sacct_parsable_output,
+    parse_scontrol_output,
+    parse_squeue_output,
+)
+
+SQUEUE_OUTPUT = """\
+             JOBID PARTITION     NAME     USER ST       TIME  NODES NODELIST(REASON)
+           1234567      main     bash  someone  R       5:01      1 cn-a001
+           1234568      long my job    someone PD       0:00      2 (ReqNodeNotAvail, Reserved)
+"""
+
+SCONTROL_OUTPUT = """\
+JobId=1234567 JobName=bash
+   UserId=someone(1000) GroupId=someone(1000)
+   JobState=PENDING Reason=ReqNodeNotAvail, Reserved for maintenance Dependency=(null)
+   TRES=cpu=4,mem=16G,node=1
+
+JobId=1234568 JobName=my job
+   JobState=RUNNING Reason=None Dependency=(null)
+
+"""
+
+
+def test_parse_default_squeue_format():
+    jobs = parse_squeue_output(SQUEUE_OUTPUT)
+    assert jobs == [
+        {
+            "JOBID": "1234567",
+            "PARTITION": "main",
+            "NAME": "bash",
+            "USER": "someone",
+            "ST": "R",
+            "TIME": "5:01",
+            "NODES": "1",
+            "NODELIST(REASON)": "cn-a001",
+        },
+        {
+            "JOBID": "1234568",
+            "PARTITION": "long",
+            "NAME": "my job",
+            "USER": "someone",
+            "ST": "PD",
+            "TIME": "0:00",
+            "NODES": "2",
+            "NODELIST(REASON)": "(ReqNodeNotAvail, Reserved)",
+        },
+    ]
+
+
+def test_parse_unpadded_squeue_format():
+    output = "JOBID STATE\n1234567 RUNNING\n1234568 PENDING\n"
+    assert parse_squeue_output(output) == [
+        {"JOBID": "1234567", "STATE": "RUNNING"},
+        {"JOBID": "1234568", "STATE": "PENDING"},
+    ]
+    assert parse_squeue_output("") == []
+
+
+def test_compact_json():
+    output = '{\n  "jobs": [\n    {\n      "job_id": 1,\n      "name": "my job"\n    }\n  ]\n}\n'
+    assert compact_json(output) == '{"jobs":[{"job_id":1,"name":"my job"}]}'
+    assert compact_json("squeue: error: Invalid user") == "squeue: error: Invalid user"
+
+
+def test_job_states_from_squeue_output():
+    assert job_states_from_squeue_output(SQUEUE_OUTPUT) == {
+        "1234567": "RUNNING",
+        "1234568": "PENDING",
+    }
+    assert job_states_from_squeue_output("JOBID STATE\n42 COMPLETING\n") == {"42": "COMPLETING"}
+
+
+def test_parse_job_states_output():
+    output = "Wed Oct 14 05:09:09 2026\n1234567,RUNNING\n1234568,PENDING\n"
+    assert parse_job_states_output(output) == {"1234567": "RUNNING", "1234568": "PENDING"}
+
+
+def test_parse_scontrol_output():
+    first, second = parse_scontrol_output(SCONTROL_OUTPUT)
+    assert first["JobId"] == "1234567"
+    assert first["UserId"] == "someone(1000)"
+    assert first["Reason"] == "ReqNodeNotAvail, Reserved for maintenance"
+    assert first["TRES"] == "cpu=4,mem=16G,node=1"
+    assert second == {
+        "JobId": "1234568",
+        "JobName": "my job",
+        "JobState": "RUNNING",
+        "Reason": "None",
+        "Dependency": "(null)",
+    }
+
+
+def test_parse_sacct_parsable_output():
+    output = (
+        "1234567|my job|RUNNING|0:0\n1234567.batch|batch|RUNNING|0:0\n1234568|a|b|FAILED|1:0\n"
+    )
+    fields = ["JobID", "JobName", "State", "ExitCode"]
+    rows = parse_sacct_parsable_output(output, fields)
+    assert rows[0] == {
+        "JobID": "1234567",
+        "JobName": "my job",
+        "State": "RUNNING",
+        "ExitCode": "0:0",
+    }
+    assert rows[1]["JobID"] == "1234567.batch"
+    # The job name of the last row contains a `|`, so its values can't be assigned to fields.
+    assert len(rows) == 2
+
+
+def test_parse_scontrol_show_node():
+    output = (
+        "NodeName=cn-a001 Arch=x86_64 CoresPerSocket=32\n"
+        "   Gres=gpu:a100:4(S:0-1) State=MIXED ThreadsPerCore=1\n"
+        "   Socks/Node=* ReqB:S:C:T=0:0:*:*\n"
+        "   Reason=Kill task failed [root@2025-01-01T00:00:00]\n"
+    )
+    (node,) = parse_scontrol_output(output)
+    assert node == {
+        "NodeName": "cn-a001",
+        "Arch": "x86_64",
+        "CoresPerSocket": "32",
+        "Gres": "gpu:a100:4(S:0-1)",
+        "State": "MIXED",
+        "ThreadsPerCore": "1",
+        "Socks/Node": "*",
+        "ReqB:S:C:T": "0:0:*:*",
+        "Reason": "Kill task failed [root@2025-01-01T00:00:00]",
+    }
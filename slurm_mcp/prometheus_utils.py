@@ -5,13 +5,15 @@ import os
 from pathlib import Path
 import zoneinfo
 from datetime import datetime
-from typing import Literal, Sequence
+from typing import TYPE_CHECKING, Literal, Sequence
 
-import pandas as pd
 import pydantic
-from prometheus_api_client.metric_range_df import MetricRangeDataFrame
 import numpy as np
 from slurm_mcp.slurm_model import SlurmJob
+
+if TYPE_CHECKING:
+    # Importing pandas is slow, and it's only needed to make DataFrames of the metric values.
+    import pandas as pd
 # from sarc.client.job import SlurmJob as SarcSlurmJob
 
 logger = logging.getLogger(__name__)
@@ -237,7 +239,7 @@ def get_job_time_series(
     max_points: int = 100,
     measure: str | None = None,
     aggregation: Literal["total", "interval"] | None = "total",
-) -> pd.DataFrame | None:
+) -> "pd.DataFrame | None":
     """Fetch job metrics.
 
     Arguments:
@@ -269,7 +271,11 @@ def get_job_time_series(
         # so that it can be set
         # with env var SARC_CACHE
     )
-    return MetricRangeDataFrame(results) if results else None
+    if not results:
+        return None
+    from prometheus_api_client.metric_range_df import MetricRangeDataFrame
+
+    return MetricRangeDataFrame(results)
 
 
 # pylint: disable=too-many-branches
@@ -357,7 +363,7 @@ def _get_job_time_series_data(
     else:
         query = f"{query}[{duration_seconds}s:{interval}s] {offset_string}"
 
-    logger.debug(f"prometheus query with offset: {query}")
+    logger.debug("prometheus query with offset: %s", query)
     return get_prometheus_client(job.cluster).custom_query(query)
 
 
@@ -385,5 +391,3 @@ def get_prometheus_client(cluster: str):
 #     Path.home() / "repos" / "SARC" / "config" / "sarc-client.yaml"
 # )
 # from sarc.jobs.series import get_job_time_series
-
-logger = logging.getLogger(__name__)
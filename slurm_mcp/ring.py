@@ -0,0 +1,129 @@
+"""Submission / completion queues to run many commands on a cluster and collect their results.
+
+Commands are submitted without waiting for them, a few worker tasks run them concurrently (each in
+its own `ssh` session over the shared connection), and the results can be reaped in the order in
+which they complete:
+
+```python
+async with CommandRing("mila") as ring:
+    ring.submit("squeue --me", user_data="squeue")
+    ring.submit("sinfo", user_data="sinfo")
+    for completion in await ring.reap(min_complete=2):
+        print(completion.user_data, completion.exit_code)
+```
+"""
+
+import asyncio
+import dataclasses
+import logging
+import subprocess
+from typing import Any, Self
+
+from slurm_mcp.ssh_utils import MAX_PARALLEL_COMMANDS, arun_command
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Completion:
+    """The result of a command that was submitted to a `CommandRing`."""
+
+    command: str
+    output: str
+    exit_code: int
+    user_data: Any = None
+    """The value that was passed to `submit` with the command."""
+    error: Exception | None = None
+    """Set when the command couldn't be run at all (for example when it timed out)."""
+    stderr: str = ""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class _Submission:
+    command: str
+    user_data: Any
+    future: asyncio.Future[Completion]
+
+
+class CommandRing:
+    """Runs the submitted commands with `workers` concurrent tasks, and queues their results."""
+
+    def __init__(
+        self, cluster: str | None, workers: int = MAX_PARALLEL_COMMANDS, timeout: float = 30
+    ):
+        self.cluster = cluster
+        self.workers = workers
+        self.timeout = timeout
+        self._submissions: asyncio.Queue[_Submission] = asyncio.Queue()
+        self._completions: asyncio.Queue[Completion] = asyncio.Queue()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def __aenter__(self) -> Self:
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """Stops the workers. Commands that are still queued or running are cancelled.
+
+        The processes of the running commands are killed, and the futures of all the cancelled
+        commands are cancelled (they don't get a `Completion`).
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._submissions.empty():
+            self._submissions.get_nowait().future.cancel()
+
+    def submit(self, command: str, user_data: Any = None) -> asyncio.Future[Completion]:
+        """Queues a command, without waiting for it.
+
+        Returns a future for its `Completion`. The completion is also queued for `reap`, so the
+        future can be ignored.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._submissions.put_nowait(_Submission(command, user_data, future))
+        return future
+
+    async def reap(self, min_complete: int = 1) -> list[Completion]:
+        """Waits for at least `min_complete` completions, and returns all the ones available."""
+        completions = [await self._completions.get() for _ in range(min_complete)]
+        while not self._completions.empty():
+            completions.append(self._completions.get_nowait())
+        return completions
+
+    async def _worker(self) -> None:
+        while True:
+            submission = await self._submissions.get()
+            if submission.future.cancelled():
+                continue
+            try:
+                completion = await self._run(submission)
+            except asyncio.CancelledError:
+                # `close` was called while the command was running.
+                submission.future.cancel()
+                raise
+            if not submission.future.done():
+                submission.future.set_result(completion)
+            self._completions.put_nowait(completion)
+
+    async def _run(self, submission: _Submission) -> Completion:
+        command, user_data = submission.command, submission.user_data
+        try:
+            output = await arun_command(self.cluster, command, timeout=self.timeout)
+        except subprocess.CalledProcessError as err:
+            return Completion(command, err.output, err.returncode, user_data, stderr=err.stderr)
+        except Exception as err:
+            # Any other error (a timeout, no `ssh` binary, ...) is reported in the completion,
+            # so that the worker keeps running and the future doesn't stay pending forever.
+            logger.warning("Unable to run `%s` on cluster %r: %s", command, self.cluster, err)
+            return Completion(command, "", -1, user_data, error=err)
+        return Completion(command, output, 0, user_data)
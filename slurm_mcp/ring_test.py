@@ -0,0 +1,73 @@
+import asyncio
+import os
+import subprocess
+import time
+
+import pytest
+
+from slurm_mcp import ring as ring_module
+from slurm_mcp.ring import CommandRing
+
+
+def test_submitted_commands_run_concurrently():
+    async def _run() -> list[tuple[int, str, int]]:
+        async with CommandRing(None, workers=5) as ring:
+            for i in range(5):
+                ring.submit(f"sleep 0.5; echo {i}; exit {i % 2}", user_data=i)
+            completions = []
+            while len(completions) < 5:
+                completions += await ring.reap()
+        return sorted((c.user_data, c.output, c.exit_code) for c in completions)
+
+    start = time.monotonic()
+    results = asyncio.run(_run())
+    # Much less than the 2.5 seconds that they would take one after the other.
+    assert time.monotonic() - start < 1.5
+    assert results == [(i, f"{i}\n", i % 2) for i in range(5)]
+
+
+def test_submit_returns_a_future():
+    async def _run():
+        async with CommandRing(None, workers=1, timeout=0.2) as ring:
+            first = ring.submit("echo first")
+            timed_out = ring.submit("sleep 5")
+            return await first, await timed_out, await ring.reap(min_complete=2)
+
+    first, timed_out, reaped = asyncio.run(_run())
+    assert (first.output, first.exit_code) == ("first\n", 0)
+    assert isinstance(timed_out.error, subprocess.TimeoutExpired)
+    assert reaped == [first, timed_out]
+
+
+def test_unexpected_errors_are_completions(monkeypatch: pytest.MonkeyPatch):
+    async def _arun_command(cluster, command, timeout):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(ring_module, "arun_command", _arun_command)
+
+    async def _run():
+        async with CommandRing(None, workers=1) as ring:
+            # The worker keeps running after the first error.
+            return await ring.submit("first"), await ring.submit("second")
+
+    for completion in asyncio.run(_run()):
+        assert isinstance(completion.error, ValueError)
+
+
+def test_close_cancels_queued_and_running_commands(tmp_path):
+    pid_file = tmp_path / "pid"
+
+    async def _run():
+        ring = CommandRing(None, workers=1)
+        running = ring.submit(f"echo $$ > {pid_file}; sleep 5")
+        queued = ring.submit("echo queued")
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.01)
+        await ring.close()
+        return running, queued
+
+    running, queued = asyncio.run(_run())
+    assert running.cancelled() and queued.cancelled()
+    # The process of the running command was killed.
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
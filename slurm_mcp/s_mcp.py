@@ -1,12 +1,39 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
 from datetime import datetime, timedelta
+import functools
+import inspect
+import os
+import shlex
 import subprocess
 import textwrap
-from typing import Sequence
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterable, Literal, Sequence
 import numpy as np
 from fastmcp import FastMCP
 import pydantic
 import logging
+from slurm_mcp.parsing import (
+    compact_json,
+    job_states_from_squeue_output,
+    parse_sacct_parsable_output,
+    parse_scontrol_output,
+    parse_squeue_output,
+)
+from slurm_mcp.ring import CommandRing
 from slurm_mcp.slurm_model import SacctOutput, SlurmJob, State
+from slurm_mcp.squeue_poller import SQUEUE_POLL_INTERVAL, get_squeue_poller
+from slurm_mcp.ssh_utils import (
+    MAX_PARALLEL_COMMANDS,
+    connect,
+    is_connected,
+    normalize_cluster,
+    run_command,
+    run_commands,
+)
 from slurm_mcp.prometheus_utils import (
     SimpleStatistics,
     get_all_compute_metrics_for_job,
@@ -15,6 +42,141 @@ from slurm_mcp.prometheus_utils import (
 
 logger = logging.getLogger(__name__)
 
+CACHE_SIZE = 512
+"""Maximum number of results kept in `_cache`.
+
+The least recently used ones are dropped first.
+"""
+
+_cache: collections.OrderedDict[tuple, tuple[float, Any]] = collections.OrderedDict()
+"""Cache of recent results, from (function name, arguments) to (expiry time, result)."""
+
+_cache_locks: dict[tuple, threading.Lock] = {}
+_cache_lock = threading.Lock()
+"""Protects `_cache` and `_cache_locks` (but is not held while calling the cached functions)."""
+
+
+def _freeze(value: Any) -> Any:
+    """Makes lists / dicts / sets hashable so they can be used as part of a cache key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def cached(ttl: float):
+    """Caches the results of the decorated function for `ttl` seconds.
+
+    The cache key is made from the (bound) arguments of the function, so that `squeue("mila")` and
+    `squeue(cluster="mila")` share the same entry. The local machine has a single entry, whether
+    the `cluster` is `None` or `"localhost"`.
+
+    If the cluster can't be reached while refreshing an entry (a `ConnectionError`, for example
+    when the SSH connection is down, or a `TimeoutExpired`), the last cached (stale) result is
+    returned instead, when there is one. Commands that fail (`CalledProcessError`) still raise.
+
+    Concurrent calls with the same arguments wait for the first one to finish and share its
+    result, instead of all running the same command at the same time.
+
+    Cached results are shared between callers: they must not be modified.
+    """
+
+    def _decorator[**P, T](fn: Callable[P, T]) -> Callable[P, T]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def _wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            if "cluster" in arguments:
+                arguments["cluster"] = normalize_cluster(arguments["cluster"])
+            key = (fn.__qualname__, _freeze(arguments))
+            with _cache_lock:
+                lock = _cache_locks.setdefault(key, threading.Lock())
+            with lock:
+                now = time.monotonic()
+                with _cache_lock:
+                    entry = _cache.get(key)
+                    if entry is not None:
+                        _cache.move_to_end(key)
+                if entry is not None and now < entry[0]:
+                    return entry[1]
+                try:
+                    result = fn(*args, **kwargs)
+                except (ConnectionError, subprocess.TimeoutExpired):
+                    # Only when the cluster couldn't be reached: the error of a command that ran
+                    # (a `CalledProcessError`) is a real answer, and is raised.
+                    if entry is None:
+                        raise
+                    logger.warning(
+                        "Call to %s failed, returning a stale result from %.1f seconds ago.",
+                        fn.__qualname__,
+                        now - (entry[0] - ttl),
+                        exc_info=True,
+                    )
+                    return entry[1]
+                _store(key, (now + ttl, result))
+                return result
+
+        return _wrapper
+
+    return _decorator
+
+
+def _store(key: tuple, entry: tuple[float, Any]) -> None:
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            oldest, _ = _cache.popitem(last=False)
+            # Expired entries are kept (as stale fallbacks) until they are evicted here.
+            lock = _cache_locks.get(oldest)
+            if lock is not None and not lock.locked():
+                del _cache_locks[oldest]
+
+
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def parallel_map[T, R](fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+    """Calls `fn` on each item in a shared pool of worker threads, and returns results in order.
+
+    This is meant for independent, I/O-bound calls, for example one Prometheus query per job.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="slurm_mcp"
+                )
+    return list(_executor.map(fn, items))
+
+
+_connected_clusters: set[str] = set()
+"""Clusters that `lifespan` already connected to (or tried to) in this process."""
+
+
+@contextlib.asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Connects to the clusters listed in `SLURM_MCP_CLUSTERS` (comma-separated) at startup.
+
+    This can run once per client session, so each cluster is only connected to once per process.
+    The connections are shared by all sessions, and closed when the process exits (see
+    `close_shells` and `stop_pollers`), not when a session ends.
+    """
+    clusters = {c.strip() for c in os.environ.get("SLURM_MCP_CLUSTERS", "").split(",")}
+    clusters = {cluster for cluster in clusters if cluster} - _connected_clusters
+    _connected_clusters.update(clusters)
+    await asyncio.gather(*(asyncio.to_thread(connect, cluster) for cluster in clusters))
+    yield
+
+
 mcp = FastMCP(
     "SLURM MCP 🚀",
     instructions=textwrap.dedent("""\
@@ -23,6 +185,7 @@ mcp = FastMCP(
     - If you need to do calculations, use the calculator tool.
     - Fetch information from the SLURM docs if necessary.
     """),
+    lifespan=lifespan,
 )
 
 
@@ -58,7 +221,7 @@ def get_simplified_job(job: SlurmJob) -> SimplifiedSlurmJob:
 
 
 @mcp.tool
-def get_slurm_job_ids(
+async def get_slurm_job_ids(
     cluster: str | None = None,
     state: State | None = None,
     start: datetime | None = None,
@@ -72,7 +235,8 @@ def get_slurm_job_ids(
         start: Optional start datetime to filter jobs that started after this time.
         end: Optional end datetime to filter jobs that ended before this time.
     """
-    return [job.job_id for job in find_jobs_from_sacct(cluster, state, start, end)]
+    jobs = await asyncio.to_thread(find_jobs_from_sacct, cluster, state, start, end)
+    return [job.job_id for job in jobs]
 
 
 # @mcp.tool
@@ -122,7 +286,7 @@ class TotalJobComputeUsageStats(pydantic.BaseModel):
 
 
 @mcp.tool
-def get_total_compute_usage_on_cluster_in_period(
+async def get_total_compute_usage_on_cluster_in_period(
     cluster: str | None = None,
     state: State | None = None,
     start: datetime | None = None,
@@ -144,7 +308,8 @@ def get_total_compute_usage_on_cluster_in_period(
     this gives all the job IDs as well as the aggregated metrics in one go.
     """
     # jobs = get_jobs_from_sacct(cluster, job_ids=job_ids)
-    return get_total_compute_usage_stats_fn(
+    return await asyncio.to_thread(
+        get_total_compute_usage_stats_fn,
         cluster=cluster,
         state=state,
         start=start,
@@ -153,7 +318,7 @@ def get_total_compute_usage_on_cluster_in_period(
 
 
 @mcp.tool
-def get_total_compute_usage_of_jobs(
+async def get_total_compute_usage_of_jobs(
     job_ids: list[int],
     cluster: str | None = None,
 ) -> TotalJobComputeUsageStats:
@@ -168,51 +333,163 @@ def get_total_compute_usage_of_jobs(
         Aggregated metrics: number of jobs and gpus, average gpu util, total compute cost and waste
     """
     # jobs = get_jobs_from_sacct(cluster, job_ids=job_ids)
+    return await asyncio.to_thread(get_total_compute_usage_of_jobs_fn, cluster, job_ids)
+
+
+def get_total_compute_usage_of_jobs_fn(
+    cluster: str | None, job_ids: Sequence[int | str]
+) -> TotalJobComputeUsageStats:
     jobs = get_jobs(cluster=cluster, job_ids=job_ids)
-    job_stats = [get_job_gpu_metrics(job) for job in jobs]
+    job_stats = parallel_map(get_job_gpu_metrics, jobs)
     stats = [get_cost_waste_stats(job, stats) for job, stats in zip(jobs, job_stats)]
     total_stats = sum_compute_usage_stats(jobs, stats)
     return total_stats
 
 
 @mcp.tool
-def squeue(
+async def squeue(
     cluster: str | None = None,
     format: str | None = None,
-) -> str:
+    parsed: bool = False,
+    only_job_state: bool = False,
+    job_ids: list[int] | None = None,
+) -> str | list[dict[str, str]]:
     """Calls `squeue --me` on the SLURM cluster (local or over SSH) with an optional `--format`.
 
     Args:
         cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
         format: Optional format string for `squeue --format=...`. See `squeue --helpformat` for allowed fields.
+        parsed: Return one dict per job (from column name to value) instead of the raw output.
+        only_job_state: Only get the id and state of each job (`format` is ignored). Together
+            with `job_ids`, this uses `squeue --only-job-state` when the cluster supports it,
+            which is much cheaper for the SLURM controller, and lists those jobs even if they
+            belong to other users. Prefer it when checking whether jobs are still pending /
+            running. Without `job_ids`, this lists the id and state of all your jobs.
+        job_ids: Only show these jobs (`squeue --jobs=...`). The output is empty when none of
+            them are in the queue anymore.
 
     Returns:
-        str: The string output of the `squeue` command.
+        str: The string output of the `squeue` command, or the parsed jobs if `parsed` is True.
     """
+    output = await asyncio.to_thread(squeue_fn, cluster, format, only_job_state, job_ids)
+    return parse_squeue_output(output) if parsed else output
+
+
+@cached(ttl=5)
+def squeue_fn(
+    cluster: str | None = None,
+    format: str | None = None,
+    only_job_state: bool = False,
+    job_ids: Sequence[int | str] | None = None,
+) -> str:
     # jobs = get_jobs_from_sacct(cluster, job_ids=job_ids)
-    # TODO: Need to make sure there aren't any embedded commands in the format string!
-    # We could also use the format spec from slurm. Allowed parts are given in `squeue --helpformat` apparently, and `squeue --helpFormat`
-    # shows some more info.
-    # This is a pretty naive check, but it's better than nothing for now.
-    assert format is None or all(c.isalnum() or c in "_%-," for c in format)
-    format_arg = f"--format='{format}'" if format else ""
-    return subprocess.check_output(
-        ["ssh", cluster, "squeue --me " + format_arg]
-        if cluster
-        else (
-            [
-                "squeue",
-                "--me",
-            ]
-            + ([format_arg] if format else [])
-        ),
-        text=True,
-        timeout=30,
-    )
+    if format is None and not only_job_state and not job_ids and SQUEUE_POLL_INTERVAL > 0:
+        # Served from the background `squeue --iterate` process when it has a recent snapshot.
+        if (output := get_squeue_poller(cluster).latest_output()) is not None:
+            return output
+    command = cluster_squeue_command(cluster, format, only_job_state, job_ids)
+    try:
+        return run_command(cluster, command, timeout=30)
+    except subprocess.CalledProcessError as err:
+        # squeue fails (instead of listing nothing) when none of the jobs are in the queue.
+        if job_ids and "Invalid job id" in (err.stderr or ""):
+            return ""
+        raise
+
+
+_SQUEUE_COMMAND = "squeue --me"
+_SQUEUE_JSON_COMMAND = "squeue --me --json"
+_SQUEUE_JOB_STATES_COMMAND = shlex.join(["squeue", "--me", "--format=%i %T"])
+
+
+def cluster_squeue_command(
+    cluster: str | None,
+    format: str | None = None,
+    only_job_state: bool = False,
+    job_ids: Sequence[int | str] | None = None,
+) -> str:
+    """Like `squeue_command`, but only uses `--only-job-state` if the cluster supports it."""
+    use_option = bool(only_job_state and job_ids) and supports_only_job_state(cluster)
+    return squeue_command(format, only_job_state, job_ids, only_job_state_option=use_option)
+
+
+def squeue_command(
+    format: str | None = None,
+    only_job_state: bool = False,
+    job_ids: Sequence[int | str] | None = None,
+    only_job_state_option: bool = True,
+) -> str:
+    """Returns the `squeue` command to run (`squeue --me ...`).
+
+    With `only_job_state`, only the id and state of the jobs are listed. `--only-job-state`
+    ignores `--me`, so it is only used (with `only_job_state_option`) to look up given `job_ids`,
+    and those jobs are then listed whoever they belong to, with or without the option.
+    """
+    if not job_ids:
+        if only_job_state:
+            return _SQUEUE_JOB_STATES_COMMAND
+        if not format:
+            return _SQUEUE_COMMAND
+    job_ids = tuple(map(str, job_ids or ()))
+    return _build_squeue_command(format, only_job_state, job_ids, only_job_state_option)
+
+
+# Pollers call this with the same few formats / job ids over and over, so the commands are cached.
+@functools.lru_cache(maxsize=256)
+def _build_squeue_command(
+    format: str | None, only_job_state: bool, job_ids: tuple[str, ...], only_job_state_option: bool
+) -> str:
+    # The jobs of other users are only listed when looking up the states of specific jobs.
+    args = ["squeue"] if only_job_state and job_ids else ["squeue", "--me"]
+    if job_ids:
+        args.append(f"--jobs={','.join(job_ids)}")
+    if only_job_state:
+        if only_job_state_option:
+            # Served from the job state cache of slurmctld. `--partition`, `--user` and most
+            # other filters are ignored with this option.
+            args.append("--only-job-state")
+        format = "%i %T"
+    # Allowed parts of the format are given in `squeue --helpformat`, and `squeue --helpFormat`
+    # shows some more info. The arguments are quoted, so there can't be any embedded commands.
+    if format:
+        args.append(f"--format={format}")
+    return shlex.join(args)
+
+
+@functools.cache
+def supports_only_job_state(cluster: str | None) -> bool:
+    """Checks (once per cluster) if the version of `squeue` has the `--only-job-state` option."""
+    return "--only-job-state" in run_command(cluster, "squeue --help 2>&1", timeout=30)
+
+
+@mcp.tool
+async def get_job_state(job_id: int | str, cluster: str | None = None) -> str | None:
+    """Returns the current state of a job in the queue (for example `PENDING` or `RUNNING`).
+
+    This is answered from the latest snapshot of the (background) `squeue` process when there is
+    one, so it is very cheap to call repeatedly to check on a job.
+
+    Args:
+        job_id: The job id.
+        cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
+
+    Returns:
+        The state of the job, or `None` if the job isn't in the queue anymore. Use
+        `get_simple_job_info_from_sacct` to get the final state of jobs that are done.
+    """
+    return await asyncio.to_thread(get_job_state_fn, cluster, job_id)
+
+
+def get_job_state_fn(cluster: str | None, job_id: int | str) -> str | None:
+    if SQUEUE_POLL_INTERVAL > 0:
+        # `squeue --iterate` with only the id and state of each job.
+        if (jobs := get_squeue_poller(cluster, job_states_only=True).job_states()) is not None:
+            return jobs.get(str(job_id))
+    return job_states_from_squeue_output(squeue_fn(cluster, only_job_state=True)).get(str(job_id))
 
 
 @mcp.tool
-def squeue_detailed_info(
+async def squeue_detailed_info(
     cluster: str | None = None,
 ) -> str:
     """Calls `squeue --me --json` on the SLURM cluster (local or over SSH).
@@ -221,13 +498,235 @@ def squeue_detailed_info(
         cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
 
     Returns:
-        str: The string output of the `squeue` command.
+        str: The JSON output of the `squeue` command (without indentation).
     """
-    return subprocess.check_output(
-        ["ssh", cluster, "squeue --me --json "] if cluster else ["squeue", "--me", "--json"],
-        text=True,
-        timeout=30,
-    )
+    return await asyncio.to_thread(squeue_detailed_info_fn, cluster)
+
+
+@cached(ttl=5)
+def squeue_detailed_info_fn(cluster: str | None = None) -> str:
+    return compact_json(run_command(cluster, _SQUEUE_JSON_COMMAND, timeout=30))
+
+
+@mcp.tool
+async def scontrol_show_jobs(
+    job_ids: list[int], cluster: str | None = None
+) -> dict[str, dict[str, str]]:
+    """Calls `scontrol show job` for one or more jobs, with a single command.
+
+    Args:
+        job_ids: The ids of the jobs.
+        cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
+
+    Returns:
+        The fields of each job (for example `JobState`, `Reason` or `NodeList`), by job id.
+    """
+    return await asyncio.to_thread(scontrol_show_jobs_fn, cluster, job_ids)
+
+
+@cached(ttl=5)
+def scontrol_show_jobs_fn(
+    cluster: str | None, job_ids: Sequence[int | str]
+) -> dict[str, dict[str, str]]:
+    output = run_command(cluster, scontrol_show_jobs_command(job_ids), timeout=30)
+    return {job["JobId"]: job for job in parse_scontrol_output(output) if "JobId" in job}
+
+
+def scontrol_show_jobs_command(job_ids: Sequence[int | str]) -> str:
+    return shlex.join(["scontrol", "show", "job", ",".join(map(str, job_ids))])
+
+
+@mcp.tool
+async def scontrol_show_nodes(
+    nodes: str | None = None, cluster: str | None = None
+) -> dict[str, dict[str, str]]:
+    """Calls `scontrol show node` to get the state and resources of the nodes of a cluster.
+
+    Args:
+        nodes: Node names or node list expression (for example `cn-a[001-004]`). When `None`,
+            gets all the nodes of the cluster.
+        cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
+
+    Returns:
+        The fields of each node (for example `State`, `CPUAlloc` or `Gres`), by node name.
+    """
+    return await asyncio.to_thread(scontrol_show_nodes_fn, cluster, nodes)
+
+
+@cached(ttl=5)
+def scontrol_show_nodes_fn(
+    cluster: str | None, nodes: str | None = None
+) -> dict[str, dict[str, str]]:
+    # The output for all the nodes can be large, and it doesn't change much from one second to
+    # the next, so polling this is served from the cache.
+    command = shlex.join(["scontrol", "show", "node", *([nodes] if nodes else [])])
+    output = run_command(cluster, command, timeout=30)
+    return {node["NodeName"]: node for node in parse_scontrol_output(output) if "NodeName" in node}
+
+
+@mcp.tool
+async def get_connection_status(cluster: str | None = None, deep: bool = False) -> bool:
+    """Checks if the server is currently connected to the given cluster.
+
+    Args:
+        cluster: Cluster hostname to check. When `None`, checks the local cluster.
+        deep: Run a command on the cluster to check that it responds, instead of only checking
+            that the connection is open.
+
+    Returns:
+        Whether the cluster is connected.
+    """
+    return await asyncio.to_thread(is_connected, cluster, deep=deep)
+
+
+class SqueueArguments(pydantic.BaseModel, extra="forbid"):
+    """Arguments of a `squeue` call in a `batch`."""
+
+    format: str | None = None
+    only_job_state: bool = False
+    job_ids: list[int] | None = None
+
+
+class SqueueDetailedInfoArguments(pydantic.BaseModel, extra="forbid"):
+    """Arguments of a `squeue_detailed_info` call in a `batch` (there are none)."""
+
+
+class SacctJobsArguments(pydantic.BaseModel, extra="forbid"):
+    """Arguments of a `get_simple_job_info_from_sacct` call in a `batch`."""
+
+    job_ids: list[int]
+
+
+_BATCH_ARGUMENTS: dict[str, type[pydantic.BaseModel]] = {
+    "squeue": SqueueArguments,
+    "squeue_detailed_info": SqueueDetailedInfoArguments,
+    "get_simple_job_info_from_sacct": SacctJobsArguments,
+}
+
+
+class BatchCall(pydantic.BaseModel):
+    """A call to one of the (read-only) tools, as part of a `batch`."""
+
+    tool: Literal["squeue", "squeue_detailed_info", "get_simple_job_info_from_sacct"]
+    arguments: dict[str, Any] = {}
+    """Arguments of the tool, except for the `cluster`."""
+
+
+@mcp.tool
+async def batch(
+    calls: list[BatchCall],
+    cluster: str | None = None,
+    parallel: bool = False,
+) -> list[str | list[SimplifiedSlurmJob]]:
+    """Runs multiple tool calls on the same cluster at once, in a single round-trip.
+
+    Prefer this over calling the tools one after the other when you need the results of several
+    of them, for example `squeue` and `get_simple_job_info_from_sacct` for some job ids.
+
+    Args:
+        calls: The tool calls to make. Only `squeue` (with optional `format`, `only_job_state`
+            and `job_ids` arguments), `squeue_detailed_info` (without arguments) and
+            `get_simple_job_info_from_sacct` (with a `job_ids` argument) are supported.
+        cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
+        parallel: Run the calls at the same time (a few at a time, each in its own SSH session)
+            instead of one after the other. This is faster when some of them are slow (for
+            example `sacct` for many jobs).
+
+    Returns:
+        The result of each call, in the same order. Calls that fail (or have invalid arguments)
+        return an error message instead, without preventing the other calls from running.
+    """
+    if parallel:
+        return await batch_parallel_fn(cluster, calls)
+    return await asyncio.to_thread(batch_fn, cluster, calls)
+
+
+def batch_fn(
+    cluster: str | None, calls: Sequence[BatchCall]
+) -> list[str | list[SimplifiedSlurmJob]]:
+    commands, errors = _batch_commands(cluster, calls)
+    return _batch_results(calls, errors, run_commands(cluster, commands, timeout=30))
+
+
+async def batch_parallel_fn(
+    cluster: str | None, calls: Sequence[BatchCall]
+) -> list[str | list[SimplifiedSlurmJob]]:
+    """Like `batch_fn`, but runs each command in its own `ssh` session, a few at a time."""
+    # Checking if the cluster supports `--only-job-state` can run a command.
+    commands, errors = await asyncio.to_thread(_batch_commands, cluster, calls)
+    # Each running command is a session on the SSH connection, so only a few run at a time.
+    async with CommandRing(cluster, workers=MAX_PARALLEL_COMMANDS, timeout=30) as ring:
+        completions = await asyncio.gather(*(ring.submit(command) for command in commands))
+    results = [
+        subprocess.CompletedProcess(
+            completion.command,
+            completion.exit_code,
+            completion.output,
+            completion.stderr if completion.error is None else str(completion.error),
+        )
+        for completion in completions
+    ]
+    return _batch_results(calls, errors, results)
+
+
+def _batch_commands(
+    cluster: str | None, calls: Sequence[BatchCall]
+) -> tuple[list[str], dict[int, str]]:
+    """Returns the commands of the valid calls, and the error messages of the invalid ones."""
+    commands: list[str] = []
+    errors: dict[int, str] = {}
+    for index, call in enumerate(calls):
+        try:
+            commands.append(_batch_command(cluster, call))
+        except pydantic.ValidationError as err:
+            errors[index] = f"Error: invalid arguments for `{call.tool}`:\n{err}"
+        except (subprocess.SubprocessError, OSError) as err:
+            # Checking if the cluster supports `--only-job-state` failed.
+            errors[index] = f"Error: unable to prepare `{call.tool}`: {err}"
+    return commands, errors
+
+
+def _batch_results(
+    calls: Sequence[BatchCall],
+    errors: dict[int, str],
+    results: Sequence[subprocess.CompletedProcess[str]],
+) -> list[str | list[SimplifiedSlurmJob]]:
+    completed = iter(results)
+    return [
+        errors[index] if index in errors else _batch_result(call, next(completed))
+        for index, call in enumerate(calls)
+    ]
+
+
+def _batch_command(cluster: str | None, call: BatchCall) -> str:
+    arguments = _BATCH_ARGUMENTS[call.tool].model_validate(call.arguments)
+    if isinstance(arguments, SqueueArguments):
+        return cluster_squeue_command(
+            cluster, arguments.format, arguments.only_job_state, arguments.job_ids
+        )
+    if isinstance(arguments, SacctJobsArguments):
+        return sacct_jobs_command(arguments.job_ids)
+    return _SQUEUE_JSON_COMMAND
+
+
+def _batch_result(
+    call: BatchCall, result: subprocess.CompletedProcess[str]
+) -> str | list[SimplifiedSlurmJob]:
+    output = result.stdout
+    if result.returncode != 0:
+        return (
+            f"Error: `{call.tool}` failed with exit code {result.returncode}:\n"
+            f"{result.stderr or output}"
+        )
+    if call.tool == "get_simple_job_info_from_sacct":
+        try:
+            jobs = SacctOutput.model_validate_json(output).jobs
+        except pydantic.ValidationError as err:
+            return f"Error: unable to parse the output of `{call.tool}`:\n{err}"
+        return [get_simplified_job(job) for job in jobs]
+    if call.tool == "squeue_detailed_info":
+        return compact_json(output)
+    return output
 
 
 def get_total_compute_usage_stats_fn(
@@ -237,7 +736,7 @@ def get_total_compute_usage_stats_fn(
     end: datetime | None = None,
 ) -> TotalJobComputeUsageStats:
     jobs = find_jobs_from_sacct(cluster, state=state, start=start, end=end)
-    job_stats = [get_job_gpu_metrics(job) for job in jobs]
+    job_stats = parallel_map(get_job_gpu_metrics, jobs)
     stats = [get_cost_waste_stats(job, stats) for job, stats in zip(jobs, job_stats)]
     total_stats = sum_compute_usage_stats(jobs, stats)
     return total_stats
@@ -275,20 +774,20 @@ def sum_compute_usage_stats(
 
 
 @mcp.tool
-def get_job_gpu_compute_stats(
+async def get_job_gpu_compute_stats(
     cluster: str | None,
     job_ids: Sequence[int | str],
 ) -> dict[int, JobComputeUsageStats]:
     """Retrieve GPU utilization and sm_efficiency metrics for a list of SLURM job IDs on a (remote
     or local) cluster from prometheus."""
-    return get_job_gpu_compute_stats_fn(cluster, job_ids)
+    return await asyncio.to_thread(get_job_gpu_compute_stats_fn, cluster, job_ids)
 
 
 def get_job_gpu_compute_stats_fn(
     cluster: str | None, job_ids: Sequence[int | str]
 ) -> dict[int, JobComputeUsageStats]:
     jobs = get_jobs(cluster, job_ids=job_ids)
-    job_stats = [get_job_gpu_metrics(job) for job in jobs]
+    job_stats = parallel_map(get_job_gpu_metrics, jobs)
     return {job.job_id: get_cost_waste_stats(job, stats) for job, stats in zip(jobs, job_stats)}
 
 
@@ -307,13 +806,13 @@ def get_job_full_compute_stats_fn(
     cluster: str | None, job_ids: Sequence[int | str]
 ) -> dict[int, JobComputeUsageStats]:
     jobs = get_jobs(cluster, job_ids=job_ids)
-    job_stats = [get_all_compute_metrics_for_job(job) for job in jobs]
+    job_stats = parallel_map(get_all_compute_metrics_for_job, jobs)
     # TODO: Add the cost/waste to JobStatistics perhaps?
     return {job.job_id: get_cost_waste_stats(job, stats) for job, stats in zip(jobs, job_stats)}
 
 
 @mcp.tool
-def get_simple_job_info_from_sacct(
+async def get_simple_job_info_from_sacct(
     cluster: str | None, job_ids: Sequence[int | str]
 ) -> list[SimplifiedSlurmJob]:
     """Retrieve some high-level information about the given jobs on a SLURM cluster using the
@@ -327,12 +826,43 @@ def get_simple_job_info_from_sacct(
     """
     if isinstance(job_ids, str):
         job_ids = [job_ids]
-    jobs_json = get_jobs(cluster, job_ids=job_ids)
+    jobs_json = await asyncio.to_thread(get_jobs, cluster, job_ids=job_ids)
     return [get_simplified_job(job) for job in jobs_json]
 
 
+SACCT_FIELDS = ("JobID", "JobName", "State", "ExitCode", "Elapsed", "Start", "End", "NodeList")
+"""Fields that are shown by the `sacct` tool by default."""
+
+
 @mcp.tool
-def get_detailed_job_info_from_sacct(
+async def sacct(
+    job_ids: list[int | str],
+    cluster: str | None = None,
+    fields: list[str] | None = None,
+) -> list[dict[str, str]]:
+    """Calls `sacct` for the given jobs, and returns only the requested fields.
+
+    This is much lighter than `get_detailed_job_info_from_sacct` when only a few fields are
+    needed. There is one row per job and per job step.
+
+    Args:
+        job_ids: List of job IDs to retrieve information for.
+        cluster: Cluster hostname to query over SSH. When `None`, uses the local cluster.
+        fields: The fields to get (see `sacct --helpformat`). Defaults to `SACCT_FIELDS`.
+    """
+    return await asyncio.to_thread(sacct_fn, cluster, job_ids, fields or SACCT_FIELDS)
+
+
+@cached(ttl=30)
+def sacct_fn(
+    cluster: str | None, job_ids: Sequence[int | str], fields: Sequence[str] = SACCT_FIELDS
+) -> list[dict[str, str]]:
+    output = run_command(cluster, sacct_parsable_command(job_ids, fields), timeout=30)
+    return parse_sacct_parsable_output(output, fields)
+
+
+@mcp.tool
+async def get_detailed_job_info_from_sacct(
     cluster: str | None, job_ids: Sequence[int | str]
 ) -> list[SlurmJob]:
     """Retrieve detailed information about the given jobs on a SLURM cluster using the `sacct`
@@ -346,43 +876,57 @@ def get_detailed_job_info_from_sacct(
     """
     if isinstance(job_ids, str):
         job_ids = [job_ids]
-    jobs_json = get_jobs(cluster, job_ids=job_ids)
+    jobs_json = await asyncio.to_thread(get_jobs, cluster, job_ids=job_ids)
     return jobs_json
 
 
-# TODO: Implement a smart caching with a timeout
-# @functools.lru_cache()
+@cached(ttl=30)
 def get_jobs(cluster: str | None, job_ids: Sequence[int | str]) -> list[SlurmJob]:
-    if isinstance(job_ids, str):
-        job_ids = [job_ids]
-    cmd = (
-        [
-            "ssh",
-            cluster,
-            f"sacct --json --user=$USER --jobs={','.join(map(str, job_ids))}",
-        ]
-        if cluster
-        else ["sacct", "--json", "--user=$USER", f"--jobs={','.join(map(str, job_ids))}"]
-    )
     jobs_json = SacctOutput.model_validate_json(
-        subprocess.check_output(cmd, text=True, timeout=30)
+        run_command(cluster, sacct_jobs_command(job_ids), timeout=30)
     )
     return jobs_json.jobs
 
 
+_SACCT_COMMAND = "sacct --json --user=$USER"
+_SACCT_TIME_FORMAT = "%Y-%m-%d-%H:%M:%S"
+
+# The same job ids / fields tend to be quoted over and over again when polling.
+_quote = functools.lru_cache(maxsize=1024)(shlex.quote)
+
+
+def sacct_jobs_command(job_ids: Sequence[int | str]) -> str:
+    if isinstance(job_ids, (str, int)):
+        job_ids = [job_ids]
+    return f"{_SACCT_COMMAND} --jobs={_quote(','.join(map(str, job_ids)))}"
+
+
+def sacct_parsable_command(job_ids: Sequence[int | str], fields: Sequence[str]) -> str:
+    return (
+        f"sacct --user=$USER --jobs={_quote(','.join(map(str, job_ids)))} "
+        f"--parsable2 --noheader --format={_quote(','.join(fields))}"
+    )
+
+
+def sacct_search_command(
+    state: State | None = None, start: datetime | None = None, end: datetime | None = None
+) -> str:
+    parts = [_SACCT_COMMAND]
+    if state:
+        parts.append(f"--state={_quote(state)}")
+    if start:
+        parts.append(f"--starttime={start.strftime(_SACCT_TIME_FORMAT)}")
+    if end:
+        parts.append(f"--endtime={end.strftime(_SACCT_TIME_FORMAT)}")
+    return " ".join(parts)
+
+
+@cached(ttl=30)
 def find_jobs_from_sacct(
     cluster: str | None, state: State | None, start: datetime | None, end: datetime | None
 ) -> list[SlurmJob]:
-    cmd = [
-        *(("ssh", cluster) if cluster else ()),
-        "sacct --json --user $USER "
-        + (f"--state {state} " if state else "")
-        + (f"--starttime {start.strftime('%Y-%m-%d-%H:%M:%S')} " if start else "")
-        + (f"--endtime {end.strftime('%Y-%m-%d-%H:%M:%S')} " if end else ""),
-    ]
-    jobs_json = SacctOutput.model_validate_json(
-        subprocess.check_output(cmd, text=True, timeout=30)
-    )
+    cmd = sacct_search_command(state, start, end)
+    jobs_json = SacctOutput.model_validate_json(run_command(cluster, cmd, timeout=30))
     return jobs_json.jobs
 
 
@@ -432,6 +976,9 @@ def get_cost_waste_stats(
 
 
 def main():
+    # Only configure logging when running as a script, and only if the host hasn't already.
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=os.environ.get("SLURM_MCP_LOG_LEVEL", "INFO").upper())
     mcp.run()
 
 
@@ -1,12 +1,354 @@
+import asyncio
+import collections
+import subprocess
+import time
+from collections.abc import Iterator, Sequence
 from datetime import datetime, timedelta
 
+import pytest
 
+from slurm_mcp import ring, s_mcp, squeue_poller
 from slurm_mcp.s_mcp import (
     get_job_gpu_compute_stats_fn,
     get_jobs,
     get_total_compute_usage_stats_fn,
 )
 from slurm_mcp.slurm_model import SlurmJob
+from slurm_mcp.ssh_utils import PersistentShell
+
+# The exact commands that the tools are expected to run on the cluster.
+SQUEUE = "squeue --me"
+SQUEUE_JSON = "squeue --me --json"
+SQUEUE_JOB_STATES = "squeue --me '--format=%i %T'"
+SCONTROL_SHOW_NODE = "scontrol show node"
+SACCT = "sacct --json --user=$USER"
+
+
+class FakeCluster:
+    """Stands in for the cluster in the tools: returns canned outputs and records the commands.
+
+    The output of a command is looked up in `responses`, and `output` is returned for the
+    commands that aren't in there. A `CalledProcessError` in `responses` is raised instead.
+    """
+
+    def __init__(
+        self,
+        responses: dict[str, str | subprocess.CalledProcessError] | None = None,
+        output: str = "",
+    ):
+        self.responses = responses or {}
+        self.output = output
+        self.commands: list[str] = []
+
+    def run_command(self, cluster: str | None, command: str, timeout: float = 30) -> str:
+        self.commands.append(command)
+        response = self.responses.get(command, self.output)
+        if isinstance(response, subprocess.CalledProcessError):
+            raise response
+        return response
+
+    def run_commands(
+        self,
+        cluster: str | None,
+        commands: Sequence[str],
+        timeout: float = 30,
+    ) -> list[subprocess.CompletedProcess[str]]:
+        results = []
+        for command in commands:
+            try:
+                output = self.run_command(cluster, command, timeout)
+            except subprocess.CalledProcessError as err:
+                results.append(
+                    subprocess.CompletedProcess(command, err.returncode, err.output, err.stderr)
+                )
+            else:
+                results.append(subprocess.CompletedProcess(command, 0, output, ""))
+        return results
+
+    async def arun_command(self, cluster: str | None, command: str, timeout: float = 30) -> str:
+        return self.run_command(cluster, command, timeout)
+
+
+@pytest.fixture
+def fake_cluster(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeCluster]:
+    """Runs the commands of the tools on a `FakeCluster`, with empty caches."""
+    fake_cluster = FakeCluster(output="JOBID STATE\n1234567 RUNNING\n")
+    monkeypatch.setattr(s_mcp, "run_command", fake_cluster.run_command)
+    monkeypatch.setattr(s_mcp, "run_commands", fake_cluster.run_commands)
+    monkeypatch.setattr(ring, "arun_command", fake_cluster.arun_command)
+    monkeypatch.setattr(s_mcp, "_cache", collections.OrderedDict())
+    monkeypatch.setattr(s_mcp, "_cache_locks", {})
+    monkeypatch.setattr(s_mcp, "SQUEUE_POLL_INTERVAL", 0)
+    cache_clear = s_mcp.supports_only_job_state.cache_clear
+    cache_clear()
+    yield fake_cluster
+    cache_clear()
+
+
+def test_squeue_cached(fake_cluster: FakeCluster):
+    first = s_mcp.squeue_fn("mila")
+    assert s_mcp.squeue_fn(cluster="mila") == first
+    assert fake_cluster.commands == [SQUEUE]
+    s_mcp.squeue_fn("mila", format="%i %T")
+    assert len(fake_cluster.commands) == 2
+
+
+def test_local_cluster_names_share_the_cache(fake_cluster: FakeCluster):
+    s_mcp.squeue_fn(None, format="%i")
+    s_mcp.squeue_fn("localhost", format="%i")
+    assert fake_cluster.commands == ["squeue --me --format=%i"]
+
+
+def test_cache_is_bounded(fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(s_mcp, "CACHE_SIZE", 2)
+    for format in ["%i", "%T", "%j"]:
+        s_mcp.squeue_fn("mila", format=format)
+    assert len(s_mcp._cache) == len(s_mcp._cache_locks) == 2
+    # The least recently used entry was dropped.
+    s_mcp.squeue_fn("mila", format="%i")
+    assert len(fake_cluster.commands) == 4
+
+
+def test_constant_commands_are_not_rebuilt():
+    # The commands are built once, and the same string is reused every time.
+    assert s_mcp.squeue_command() is s_mcp.squeue_command() is s_mcp._SQUEUE_COMMAND
+    assert s_mcp.squeue_command(only_job_state=True) is s_mcp._SQUEUE_JOB_STATES_COMMAND
+    assert s_mcp.squeue_command("%i", job_ids=[1, 2]) is s_mcp.squeue_command("%i", job_ids=(1, 2))
+    assert s_mcp._SQUEUE_COMMAND == SQUEUE
+    assert s_mcp._SQUEUE_JSON_COMMAND == SQUEUE_JSON
+    assert s_mcp._SQUEUE_JOB_STATES_COMMAND == SQUEUE_JOB_STATES
+
+
+def test_squeue_only_job_state(fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(s_mcp, "supports_only_job_state", lambda cluster: True)
+    s_mcp.squeue_fn("mila", only_job_state=True, job_ids=[1234567, 1234568])
+    s_mcp.squeue_fn("mila", only_job_state=True)
+    assert fake_cluster.commands == [
+        "squeue --jobs=1234567,1234568 --only-job-state '--format=%i %T'",
+        # `--only-job-state` would also list the jobs of other users (it ignores `--me`).
+        SQUEUE_JOB_STATES,
+    ]
+
+
+def test_squeue_jobs_that_left_the_queue(
+    fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(s_mcp, "supports_only_job_state", lambda cluster: True)
+    now = 1000.0
+    monkeypatch.setattr(s_mcp.time, "monotonic", lambda: now)
+    command = "squeue --jobs=42 --only-job-state '--format=%i %T'"
+    fake_cluster.responses[command] = "JOBID STATE\n42 RUNNING\n"
+    assert (
+        s_mcp.squeue_fn("mila", only_job_state=True, job_ids=[42]) == "JOBID STATE\n42 RUNNING\n"
+    )
+    # The job is done: squeue fails, and that isn't hidden by the previous (cached) result.
+    fake_cluster.responses[command] = subprocess.CalledProcessError(
+        1, command, output="", stderr="slurm_load_jobs error: Invalid job id specified\n"
+    )
+    now += 10
+    assert s_mcp.squeue_fn("mila", only_job_state=True, job_ids=[42]) == ""
+    # Other errors are still raised.
+    fake_cluster.responses[command] = subprocess.CalledProcessError(1, command, stderr="oops")
+    now += 10
+    with pytest.raises(subprocess.CalledProcessError):
+        s_mcp.squeue_fn("mila", only_job_state=True, job_ids=[42])
+
+
+def test_scontrol_show_jobs_in_one_command(fake_cluster: FakeCluster):
+    job_ids = list(range(1234560, 1234570))
+    fake_cluster.output = "\n".join(f"JobId={job_id} JobState=RUNNING\n" for job_id in job_ids)
+    jobs = s_mcp.scontrol_show_jobs_fn("mila", job_ids)
+    assert fake_cluster.commands == ["scontrol show job " + ",".join(map(str, job_ids))]
+    assert list(jobs) == [str(job_id) for job_id in job_ids]
+    assert jobs["1234565"]["JobState"] == "RUNNING"
+
+
+def test_scontrol_show_node_cached(fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch):
+    fake_cluster.output = "NodeName=cn-a001 State=IDLE\n\nNodeName=cn-a002 State=MIXED\n"
+    now = 1000.0
+    monkeypatch.setattr(s_mcp.time, "monotonic", lambda: now)
+
+    nodes = s_mcp.scontrol_show_nodes_fn("mila")
+    assert nodes["cn-a002"]["State"] == "MIXED"
+    now += 4
+    assert s_mcp.scontrol_show_nodes_fn("mila") is nodes
+    assert fake_cluster.commands == [SCONTROL_SHOW_NODE]
+    now += 2
+    s_mcp.scontrol_show_nodes_fn("mila")
+    assert fake_cluster.commands == [SCONTROL_SHOW_NODE, SCONTROL_SHOW_NODE]
+
+
+def test_stale_result_when_the_shell_dies(
+    fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch
+):
+    now = 1000.0
+    monkeypatch.setattr(s_mcp.time, "monotonic", lambda: now)
+    shell = PersistentShell(None)
+    # The first call gets the output of the node, the next ones kill the shell they run in.
+    scripts = iter(["echo NodeName=cn-a001 State=IDLE"])
+    monkeypatch.setattr(
+        s_mcp,
+        "run_command",
+        lambda cluster, command, timeout=30: shell.run(next(scripts, "kill -9 $$"), timeout),
+    )
+    try:
+        nodes = s_mcp.scontrol_show_nodes_fn("mila")
+        now += 10
+        assert s_mcp.scontrol_show_nodes_fn("mila") is nodes
+    finally:
+        shell.close()
+
+
+def test_no_stale_result_when_the_command_fails(
+    fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch
+):
+    now = 1000.0
+    monkeypatch.setattr(s_mcp.time, "monotonic", lambda: now)
+    s_mcp.scontrol_show_nodes_fn("mila")
+    now += 10
+    fake_cluster.responses[SCONTROL_SHOW_NODE] = subprocess.CalledProcessError(1, "scontrol")
+    with pytest.raises(subprocess.CalledProcessError):
+        s_mcp.scontrol_show_nodes_fn("mila")
+
+
+def test_sacct_parsable2_rows(fake_cluster: FakeCluster):
+    fake_cluster.output = "1234567|COMPLETED|0:0\n1234567.batch|COMPLETED|0:0\n"
+    rows = s_mcp.sacct_fn("mila", [1234567], fields=("JobID", "State", "ExitCode"))
+    assert fake_cluster.commands == [
+        "sacct --user=$USER --jobs=1234567 --parsable2 --noheader --format=JobID,State,ExitCode"
+    ]
+    assert rows == [
+        {"JobID": "1234567", "State": "COMPLETED", "ExitCode": "0:0"},
+        {"JobID": "1234567.batch", "State": "COMPLETED", "ExitCode": "0:0"},
+    ]
+
+
+def test_batch(fake_cluster: FakeCluster):
+    fake_cluster.responses = {
+        SQUEUE: "JOBID STATE\n1 RUNNING\n",
+        SQUEUE_JSON: '{\n  "jobs": []\n}\n',
+    }
+    calls = [s_mcp.BatchCall(tool="squeue"), s_mcp.BatchCall(tool="squeue_detailed_info")]
+    assert s_mcp.batch_fn("mila", calls) == ["JOBID STATE\n1 RUNNING\n", '{"jobs":[]}']
+    assert fake_cluster.commands == [SQUEUE, SQUEUE_JSON]
+
+
+def test_batch_in_parallel(fake_cluster: FakeCluster):
+    fake_cluster.responses = {
+        SQUEUE: "JOBID STATE\n1 RUNNING\n",
+        f"{SACCT} --jobs=1": subprocess.CalledProcessError(
+            1, "sacct", output="", stderr="sacct: error: Invalid job id\n"
+        ),
+    }
+    calls = [
+        s_mcp.BatchCall(tool="squeue"),
+        s_mcp.BatchCall(tool="squeue", arguments={"not_an_argument": "%i"}),
+        s_mcp.BatchCall(tool="get_simple_job_info_from_sacct", arguments={"job_ids": [1]}),
+    ]
+    squeue, invalid, failed = asyncio.run(s_mcp.batch_parallel_fn("mila", calls))
+    assert squeue == "JOBID STATE\n1 RUNNING\n"
+    assert isinstance(invalid, str) and invalid.startswith("Error: invalid arguments")
+    assert failed == (
+        "Error: `get_simple_job_info_from_sacct` failed with exit code 1:\n"
+        "sacct: error: Invalid job id\n"
+    )
+
+
+def test_batch_in_parallel_runs_a_few_commands_at_a_time(
+    fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch
+):
+    running, max_running = 0, 0
+
+    async def _arun_command(cluster: str | None, command: str, timeout: float = 30) -> str:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return ""
+
+    monkeypatch.setattr(ring, "arun_command", _arun_command)
+    monkeypatch.setattr(s_mcp, "MAX_PARALLEL_COMMANDS", 2)
+    calls = [s_mcp.BatchCall(tool="squeue", arguments={"job_ids": [i]}) for i in range(10)]
+    assert asyncio.run(s_mcp.batch_parallel_fn("mila", calls)) == [""] * 10
+    assert max_running == 2
+
+
+def test_batch_errors(fake_cluster: FakeCluster):
+    fake_cluster.responses = {
+        f"{SACCT} --jobs=1": subprocess.CalledProcessError(
+            1, "sacct", output="", stderr="sacct: error: Invalid job id\n"
+        ),
+        "squeue --help 2>&1": "Usage: squeue [OPTIONS]\n",
+    }
+    calls = [
+        s_mcp.BatchCall(tool="squeue", arguments={"not_an_argument": "%i"}),
+        s_mcp.BatchCall(tool="get_simple_job_info_from_sacct", arguments={"job_ids": [1]}),
+        s_mcp.BatchCall(tool="squeue", arguments={"only_job_state": True, "job_ids": [1]}),
+    ]
+    invalid, failed, job_states = s_mcp.batch_fn("mila", calls)
+    # A call with invalid arguments doesn't prevent the others from running.
+    assert isinstance(invalid, str) and invalid.startswith("Error: invalid arguments for `squeue`")
+    assert failed == (
+        "Error: `get_simple_job_info_from_sacct` failed with exit code 1:\n"
+        "sacct: error: Invalid job id\n"
+    )
+    # The squeue of this cluster doesn't have `--only-job-state`.
+    assert job_states == "JOBID STATE\n1234567 RUNNING\n"
+    assert fake_cluster.commands[-1] == "squeue --jobs=1 '--format=%i %T'"
+
+
+def test_batch_probe_errors(fake_cluster: FakeCluster):
+    fake_cluster.responses["squeue --help 2>&1"] = subprocess.CalledProcessError(255, "squeue")
+    calls = [
+        s_mcp.BatchCall(tool="squeue", arguments={"only_job_state": True, "job_ids": [1]}),
+        s_mcp.BatchCall(tool="squeue"),
+    ]
+    probe_failed, squeue = s_mcp.batch_fn("mila", calls)
+    assert isinstance(probe_failed, str) and probe_failed.startswith("Error: unable to prepare")
+    assert squeue == "JOBID STATE\n1234567 RUNNING\n"
+
+
+def test_sacct_commands():
+    # Arguments are quoted, so they can't inject other commands.
+    assert s_mcp.sacct_jobs_command(["1;rm -rf ~"]) == f"{SACCT} --jobs='1;rm -rf ~'"
+    assert s_mcp.sacct_jobs_command([1, 2]) == f"{SACCT} --jobs=1,2"
+    assert s_mcp.sacct_search_command() == SACCT
+    assert (
+        s_mcp.sacct_search_command(
+            s_mcp.State.RUNNING, start=datetime(2025, 1, 2, 3, 4, 5), end=datetime(2025, 1, 3)
+        )
+        == f"{SACCT} --state=RUNNING --starttime=2025-01-02-03:04:05"
+        " --endtime=2025-01-03-00:00:00"
+    )
+
+
+def test_get_job_state(fake_cluster: FakeCluster):
+    assert s_mcp.get_job_state_fn("mila", 1234567) == "RUNNING"
+    assert s_mcp.get_job_state_fn("mila", "7654321") is None
+
+
+def test_get_job_state_from_poller(fake_cluster: FakeCluster, monkeypatch: pytest.MonkeyPatch):
+    # What `squeue --me --iterate=10 --noheader --format=%i,%T` prints.
+    output = "Wed Oct 14 05:09:09 2026\n1234567,PENDING\n1234568,RUNNING\n\n"
+    monkeypatch.setattr(
+        squeue_poller,
+        "command_argv",
+        lambda cluster, command: ["bash", "-c", f"printf '{output}'; sleep 30"],
+    )
+    monkeypatch.setattr(squeue_poller, "_pollers", {})
+    monkeypatch.setattr(s_mcp, "SQUEUE_POLL_INTERVAL", 10)
+    poller = s_mcp.get_squeue_poller("mila", job_states_only=True)
+    try:
+        deadline = time.monotonic() + 5
+        while poller.job_states() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert s_mcp.get_job_state_fn("mila", 1234567) == "PENDING"
+        assert s_mcp.get_job_state_fn("mila", 1234568) == "RUNNING"
+        assert s_mcp.get_job_state_fn("mila", 1234569) is None
+    finally:
+        poller.stop()
+    assert fake_cluster.commands == []
 
 
 def test_job_info_from_sacct():
@@ -0,0 +1,157 @@
+"""Background `squeue --iterate` process that keeps a local copy of the job queue up to date.
+
+Instead of running `squeue` on every tool call, a single `squeue --me --iterate=<interval>`
+process is kept open per cluster, and its latest output is served from memory. This is the
+pattern recommended by SchedMD to avoid flooding `slurmctld` with RPCs when polling.
+"""
+
+import atexit
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+from slurm_mcp.parsing import job_states_from_squeue_output, parse_job_states_output
+from slurm_mcp.ssh_utils import command_argv, normalize_cluster
+
+logger = logging.getLogger(__name__)
+
+_DATE_LINE = re.compile(r"\S+ \S+ +\d+ \d\d:\d\d:\d\d \d{4}")
+"""The date that `squeue --iterate` prints before each snapshot (`Wed Oct 14 05:09:09 2026`)."""
+
+SQUEUE_POLL_INTERVAL = int(os.environ.get("SLURM_MCP_SQUEUE_POLL_INTERVAL", "10"))
+"""Interval in seconds between two `squeue` snapshots.
+
+Set to 0 to disable the pollers.
+"""
+
+
+JOB_STATES_FORMAT = "%i,%T"
+"""Format of the `squeue` pollers that only keep the state of each job."""
+
+
+class SqueuePoller:
+    """Runs `squeue --me --iterate=<interval>` on a cluster and keeps its latest snapshot.
+
+    With `job_states_only`, only the id and state of the jobs are listed (`--noheader
+    --format=%i,%T`), which is all that `job_states` needs and is cheaper to print and parse.
+    """
+
+    def __init__(
+        self,
+        cluster: str | None,
+        interval: int = SQUEUE_POLL_INTERVAL,
+        job_states_only: bool = False,
+    ):
+        self.cluster = cluster
+        self.interval = interval
+        self.job_states_only = job_states_only
+        self._process: subprocess.Popen[str] | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._last_start = -float("inf")
+        self._output: str | None = None
+        self._job_states: dict[str, str] = {}
+        self._updated_at = -float("inf")
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Starts the `squeue` process, unless it is already running or was started recently."""
+        with self._lock:
+            now = time.monotonic()
+            # Don't keep restarting it if it keeps failing (e.g. if squeue isn't available).
+            if self.is_running or now - self._last_start < 6 * self.interval:
+                return
+            self._last_start = now
+            command = f"squeue --me --iterate={self.interval}"
+            if self.job_states_only:
+                command += f" --noheader --format={JOB_STATES_FORMAT}"
+            logger.debug("Starting `%s` on cluster %r", command, self.cluster)
+            self._process = subprocess.Popen(
+                command_argv(self.cluster, command),
+                # Otherwise `ssh` reads from the stdin of the server (the MCP transport).
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+            self._thread = threading.Thread(
+                target=self._read_snapshots, args=(self._process,), daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._process is not None:
+                self._process.kill()
+                self._process.wait()
+                self._process = None
+
+    def latest_output(self) -> str | None:
+        """Returns the output of the latest snapshot, or `None` if there isn't a recent one."""
+        with self._lock:
+            if time.monotonic() - self._updated_at > 2 * self.interval:
+                return None
+            return self._output
+
+    def job_states(self) -> dict[str, str] | None:
+        """Returns the state of each job (by job id) in the latest snapshot, or `None` if it isn't
+        recent."""
+        with self._lock:
+            if time.monotonic() - self._updated_at > 2 * self.interval:
+                return None
+            return self._job_states
+
+    def _read_snapshots(self, process: subprocess.Popen[str]) -> None:
+        assert process.stdout
+        lines: list[str] = []
+        # `squeue --iterate` prints a blank line after each snapshot.
+        for line in process.stdout:
+            if line.strip():
+                lines.append(line)
+                continue
+            if lines:
+                self._update(lines)
+            lines = []
+        logger.debug("squeue poller on cluster %r exited (%s).", self.cluster, process.poll())
+
+    def _update(self, lines: list[str]) -> None:
+        if lines and _DATE_LINE.fullmatch(lines[0].strip()):
+            lines = lines[1:]
+        output = "".join(lines)
+        job_states = (
+            parse_job_states_output(output)
+            if self.job_states_only
+            else job_states_from_squeue_output(output)
+        )
+        with self._lock:
+            self._output = output
+            self._job_states = job_states
+            self._updated_at = time.monotonic()
+
+
+_pollers: dict[tuple[str | None, bool], SqueuePoller] = {}
+_pollers_lock = threading.Lock()
+
+
+def get_squeue_poller(cluster: str | None, job_states_only: bool = False) -> SqueuePoller:
+    """Returns the (started) `squeue` poller for the given cluster."""
+    key = (normalize_cluster(cluster), job_states_only)
+    if (poller := _pollers.get(key)) is None:
+        with _pollers_lock:
+            if (poller := _pollers.get(key)) is None:
+                poller = _pollers[key] = SqueuePoller(key[0], job_states_only=job_states_only)
+    poller.start()
+    return poller
+
+
+@atexit.register
+def stop_pollers() -> None:
+    for poller in _pollers.values():
+        poller.stop()
+    _pollers.clear()
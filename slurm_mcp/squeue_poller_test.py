@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from slurm_mcp import squeue_poller
+from slurm_mcp.squeue_poller import SqueuePoller
+
+FAKE_SQUEUE_OUTPUT = """\
+             JOBID PARTITION     NAME     USER ST       TIME  NODES NODELIST(REASON)
+           1234567      main     bash  someone  R       5:01      1 cn-a001
+           1234568      long    train  someone PD       0:00      2 (Priority)
+
+"""
+
+
+# `squeue --iterate` prints the date before each snapshot.
+FAKE_SQUEUE_ITERATE_OUTPUT = (
+    f"Wed Oct 14 05:09:09 2026\n{FAKE_SQUEUE_OUTPUT}Wed Oct 14 05:09:19 2026\n{FAKE_SQUEUE_OUTPUT}"
+)
+
+
+@pytest.fixture
+def poller(monkeypatch: pytest.MonkeyPatch):
+    # Print two snapshots, then wait like `squeue --iterate` would.
+    script = f"printf '{FAKE_SQUEUE_ITERATE_OUTPUT}'; sleep 30"
+    monkeypatch.setattr(
+        squeue_poller, "command_argv", lambda cluster, command: ["bash", "-c", script]
+    )
+    poller = SqueuePoller(cluster=None, interval=10)
+    yield poller
+    poller.stop()
+
+
+def test_poller_serves_latest_snapshot(poller: SqueuePoller):
+    assert poller.latest_output() is None
+    poller.start()
+    deadline = time.monotonic() + 5
+    while poller.latest_output() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert poller.latest_output() == FAKE_SQUEUE_OUTPUT.removesuffix("\n")
+    assert poller.job_states() == {"1234567": "RUNNING", "1234568": "PENDING"}
+
+
+def test_date_line_is_not_the_header():
+    poller = SqueuePoller(cluster=None, interval=10)
+    date, header, row, _ = FAKE_SQUEUE_ITERATE_OUTPUT.splitlines(keepends=True)[:4]
+    poller._update([date, header, row])
+    assert poller.latest_output() == header + row
+    assert poller.job_states() == {"1234567": "RUNNING"}
+
+
+def test_job_states_only(monkeypatch: pytest.MonkeyPatch):
+    # What `squeue --me --iterate=10 --noheader --format=%i,%T` prints.
+    output = (
+        "Wed Oct 14 05:09:09 2026\n1234567,RUNNING\n1234568,PENDING\n\n"
+        "Wed Oct 14 05:09:19 2026\n1234567,COMPLETING\n\n"
+    )
+    commands = []
+
+    def _command_argv(cluster, command):
+        commands.append(command)
+        return ["bash", "-c", f"printf '{output}'; sleep 30"]
+
+    monkeypatch.setattr(squeue_poller, "command_argv", _command_argv)
+    poller = SqueuePoller(cluster=None, interval=10, job_states_only=True)
+    poller.start()
+    try:
+        deadline = time.monotonic() + 5
+        while poller.job_states() != {"1234567": "COMPLETING"} and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        poller.stop()
+    assert commands == ["squeue --me --iterate=10 --noheader --format=%i,%T"]
+    assert poller.job_states() == {"1234567": "COMPLETING"}
@@ -0,0 +1,522 @@
+"""Utilities to run commands on a SLURM cluster, either locally or over SSH."""
+
+import asyncio
+import atexit
+import dataclasses
+import functools
+import logging
+import os
+import queue
+import re
+import select
+import selectors
+import subprocess
+import threading
+import time
+import uuid
+from collections.abc import Sequence
+
+logger = logging.getLogger(__name__)
+
+_SENTINEL = "__SLURM_MCP_END__"
+_EXIT_CODE_PATTERN = re.compile(rb"(\d+)\n")
+_MAX_SENTINEL_LENGTH = 80
+_CHUNK_SIZE = 65536
+_BATCH_SEPARATOR = "___SLURM_MCP_SEP___"
+_BATCH_END = "___SLURM_MCP_END___"
+_BATCH_SEPARATOR_PATTERN = re.compile(
+    r"\n" + _BATCH_SEPARATOR + r":(\d+)\n(.*?)\n" + _BATCH_END + r"\n", re.DOTALL
+)
+
+SHELLS_PER_CLUSTER = int(os.environ.get("SLURM_MCP_SHELLS_PER_CLUSTER", "4"))
+"""Maximum number of persistent shells that are opened on each cluster."""
+
+MAX_PARALLEL_COMMANDS = int(os.environ.get("SLURM_MCP_MAX_PARALLEL_COMMANDS", "4"))
+"""Maximum number of commands that a parallel batch runs at the same time (one session each)."""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SSHConfig:
+    """Options used for the `ssh` connections to the clusters."""
+
+    control_path: str = "~/.ssh/slurm_mcp-%C"
+    """Path of the socket of the master connection (see `ControlPath` in `man ssh_config`)."""
+
+    control_persist: str = "10m"
+    """How long the master connection stays open after the last session is closed."""
+
+    keepalive: int = 30
+    """Interval (in seconds) between keepalive messages on idle connections."""
+
+    force_ssh: bool = False
+    """Use SSH even for `localhost`, instead of running the commands directly."""
+
+    persistent_shell: bool = True
+    """Run commands in a long-lived shell on each cluster, instead of a new process each time."""
+
+    def options(self) -> tuple[str, ...]:
+        """Options passed to `ssh` to reuse a single (multiplexed) connection to each cluster.
+
+        The first `ssh` process to a cluster becomes the "master" connection, and all the others
+        reuse its authenticated TCP connection. The master stays alive for a while after the last
+        session is closed, so restarting the server doesn't require a new handshake either.
+        """
+        return (
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={self.control_path}",
+            "-o",
+            f"ControlPersist={self.control_persist}",
+            "-o",
+            f"ServerAliveInterval={self.keepalive}",
+        )
+
+
+@functools.lru_cache(maxsize=1)
+def get_ssh_config() -> SSHConfig:
+    """Reads the SSH config from the environment variables (once).
+
+    Use `get_ssh_config.cache_clear()` to read them again.
+    """
+    return SSHConfig(
+        control_persist=os.environ.get("SLURM_SSH_CONTROL_PERSIST", "10m"),
+        keepalive=int(os.environ.get("SLURM_SSH_KEEPALIVE", "30")),
+        force_ssh=_env_flag("SLURM_FORCE_SSH", default=False),
+        persistent_shell=_env_flag("SLURM_MCP_PERSISTENT_SHELL", default=True),
+    )
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Reads a boolean environment variable, where unset / empty means `default`."""
+    if not (value := os.environ.get(name, "")):
+        return default
+    return value.lower() not in ("0", "false", "no")
+
+
+def ssh_options() -> tuple[str, ...]:
+    return get_ssh_config().options()
+
+
+_LOCAL_HOSTNAMES = frozenset({"localhost", "127.0.0.1", "::1"})
+
+
+def is_local(cluster: str | None) -> bool:
+    """Whether commands for this cluster run on this machine, without going through SSH."""
+    return cluster is None or (cluster in _LOCAL_HOSTNAMES and not get_ssh_config().force_ssh)
+
+
+def normalize_cluster(cluster: str | None) -> str | None:
+    """Returns `None` for all the names of the local machine, and the cluster otherwise.
+
+    Used as the key of per-cluster state, so that `None` and `"localhost"` share it.
+    """
+    return None if is_local(cluster) else cluster
+
+
+class PersistentShell:
+    """A long-lived `bash` session on a cluster (through SSH when `cluster` is set).
+
+    Commands are written to the stdin of the shell, followed by an `echo` of a unique sentinel
+    with the exit code of the command. The output is then read until that sentinel shows up.
+    This avoids paying for a new SSH connection and remote shell startup for every command.
+
+    The stderr of the shell is read at the same time as its stdout, so that a command that writes
+    a lot to stderr can't fill up the pipe and block. It is attached to the `CalledProcessError`
+    when the command fails, and logged otherwise.
+    """
+
+    def __init__(self, cluster: str | None):
+        self.cluster = cluster
+        self._process: subprocess.Popen[bytes] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def run(self, command: str, timeout: float = 30) -> str:
+        """Runs `command` in the shell and returns its output.
+
+        Raises a `subprocess.CalledProcessError` if the command has a non-zero exit code, a
+        `subprocess.TimeoutExpired` if it takes longer than `timeout` seconds, and a
+        `ConnectionError` if the shell keeps exiting (for example when the cluster is unreachable).
+        """
+        with self._lock:
+            if not self.is_alive:
+                self._start()
+            try:
+                return self._run(command, timeout)
+            except ConnectionError:
+                # The connection was probably dropped. Start a new shell and try once more.
+                logger.warning("Shell on cluster %r died, restarting it.", self.cluster)
+                self._start()
+                return self._run(command, timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            self._kill()
+
+    def _kill(self) -> None:
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.wait()
+        # Close our end of the pipes, since processes started by the shell might still hold them.
+        for pipe in (self._process.stdin, self._process.stdout, self._process.stderr):
+            if pipe:
+                pipe.close()
+        self._process = None
+
+    def _start(self) -> None:
+        self._kill()
+        argv = (
+            ["bash"]
+            if is_local(self.cluster)
+            else ["ssh", *ssh_options(), "-T", self.cluster, "bash"]
+        )
+        logger.debug("Starting a persistent shell with %s", argv)
+        self._process = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+
+    def _run(self, command: str, timeout: float) -> str:
+        assert self._process and self._process.stdin and self._process.stdout
+        assert self._process.stderr
+        logger.debug("Running command on cluster %r: %s", self.cluster, command)
+        marker = f"{_SENTINEL}{uuid.uuid4().hex}"
+        # Run the command in a subshell so that an `exit` doesn't end the session, and with its
+        # stdin closed so that it can't consume the commands that come after it.
+        script = f"( {command}\n) </dev/null; printf '\\n%s:%d\\n' {marker} $?\n"
+        self._process.stdin.write(script.encode())
+        # Look for this exact marker, so that output that happens to look like a sentinel (for
+        # example a log file of this server) doesn't end the output of the command early.
+        end_marker = f"\n{marker}:".encode()
+
+        out_fd = self._process.stdout.fileno()
+        err_fd = self._process.stderr.fileno()
+        fds = [out_fd, err_fd]
+        deadline = time.monotonic() + timeout
+        buffer = bytearray()
+        errors = bytearray()
+        # Only look for the sentinel in the new data (plus enough of the previous data to catch a
+        # sentinel split between two chunks), so that large outputs are only scanned once.
+        search_start = 0
+        while (end := _find_end_of_output(buffer, end_marker, search_start)) is None:
+            remaining = deadline - time.monotonic()
+            ready = select.select(fds, [], [], remaining)[0] if remaining > 0 else []
+            if not ready:
+                # The state of the shell is unknown at this point, so we don't reuse it.
+                self._kill()
+                raise subprocess.TimeoutExpired(
+                    command, timeout, output=bytes(buffer), stderr=bytes(errors)
+                )
+            if err_fd in ready:
+                if chunk := os.read(err_fd, _CHUNK_SIZE):
+                    errors += chunk
+                else:
+                    fds.remove(err_fd)
+            if out_fd in ready:
+                chunk = os.read(out_fd, _CHUNK_SIZE)
+                if not chunk:
+                    raise ConnectionError(
+                        f"Shell on cluster {self.cluster!r} exited unexpectedly: "
+                        + errors.decode(errors="replace").strip()
+                    )
+                search_start = max(0, len(buffer) - _MAX_SENTINEL_LENGTH)
+                buffer += chunk
+        # The command is done, so everything it wrote to stderr is already in the pipe.
+        while err_fd in fds and select.select([err_fd], [], [], 0)[0]:
+            if not (chunk := os.read(err_fd, _CHUNK_SIZE)):
+                break
+            errors += chunk
+
+        end_index, exit_code = end
+        output = buffer[:end_index].decode(errors="replace")
+        logger.debug("Command exit code: %d (%d bytes of output)", exit_code, len(output))
+        # The stderr of a successful command is only decoded if it is going to be logged.
+        if exit_code != 0:
+            raise subprocess.CalledProcessError(
+                exit_code, command, output=output, stderr=errors.decode(errors="replace")
+            )
+        if errors and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Stderr of command on cluster %r: %s",
+                self.cluster,
+                errors.decode(errors="replace"),
+            )
+        return output
+
+
+def _find_end_of_output(
+    buffer: bytearray, end_marker: bytes, start: int
+) -> tuple[int, int] | None:
+    """Returns the position of the end marker, and the exit code after it, once both arrived."""
+    index = buffer.find(end_marker, start)
+    if index == -1 or not (match := _EXIT_CODE_PATTERN.match(buffer, index + len(end_marker))):
+        return None
+    return index, int(match.group(1))
+
+
+class ShellPool:
+    """A few persistent shells on the same cluster.
+
+    This way, concurrent commands don't wait on each other. Shells are only opened when all the others are busy, up to `size` of them. Over SSH, they
+    all go through the same (multiplexed) connection, so an extra shell only costs a new session
+    on it. Keep `size` below the `MaxSessions` of the server (10 by default), together with the
+    sessions of the two `squeue` pollers and the `MAX_PARALLEL_COMMANDS` of a parallel batch:
+    with the defaults, that is 4 + 2 + 4 = 10 sessions per cluster.
+    """
+
+    def __init__(self, cluster: str | None, size: int = SHELLS_PER_CLUSTER):
+        self.cluster = cluster
+        self.size = size
+        # Last in, first out: the most recently used shell is reused first.
+        self._idle: queue.LifoQueue[PersistentShell] = queue.LifoQueue()
+        self._shells: list[PersistentShell] = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_alive(self) -> bool:
+        return any(shell.is_alive for shell in self._shells)
+
+    def run(self, command: str, timeout: float = 30) -> str:
+        """Runs `command` in an idle shell of the pool (see `PersistentShell.run`)."""
+        shell = self._acquire()
+        try:
+            return shell.run(command, timeout=timeout)
+        finally:
+            self._idle.put(shell)
+
+    def close(self) -> None:
+        with self._lock:
+            for shell in self._shells:
+                shell.close()
+
+    def _acquire(self) -> PersistentShell:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._shells) < self.size:
+                shell = PersistentShell(self.cluster)
+                self._shells.append(shell)
+                return shell
+        return self._idle.get()
+
+
+_shells: dict[str | None, ShellPool] = {}
+"""Dict from cluster name (or `None` for the local machine) to its persistent shells."""
+_shells_lock = threading.Lock()
+
+
+def get_shell(cluster: str | None) -> ShellPool:
+    cluster = normalize_cluster(cluster)
+    if (shell := _shells.get(cluster)) is None:
+        # Tools run in worker threads: make sure that only one pool gets created per cluster.
+        with _shells_lock:
+            if (shell := _shells.get(cluster)) is None:
+                shell = _shells[cluster] = ShellPool(cluster)
+    return shell
+
+
+def connect(cluster: str | None) -> bool:
+    """Opens the persistent shell (and SSH connection) to a cluster ahead of time.
+
+    Returns whether the connection succeeded. Errors are logged rather than raised.
+    """
+    try:
+        run_command(cluster, "true", timeout=30)
+    except (subprocess.SubprocessError, OSError):
+        logger.warning("Unable to connect to cluster %r", cluster, exc_info=True)
+        return False
+    return True
+
+
+def command_argv(cluster: str | None, command: str) -> list[str]:
+    """Returns the arguments to run `command` in a new `ssh` (or local `bash`) process."""
+    if is_local(cluster):
+        return ["bash", "-c", command]
+    return ["ssh", *ssh_options(), cluster, command]
+
+
+def run_command(
+    cluster: str | None, command: str, timeout: float = 30, persistent: bool | None = None
+) -> str:
+    """Runs a shell command on the given cluster (or locally when `cluster` is `None`).
+
+    By default, the command goes through a persistent shell session on that cluster, unless
+    that is disabled with `SLURM_MCP_PERSISTENT_SHELL=0`. Set `persistent=False` to run it in a
+    separate `ssh` / `bash` process instead.
+    """
+    if persistent is None:
+        persistent = get_ssh_config().persistent_shell
+    if persistent:
+        return get_shell(cluster).run(command, timeout=timeout)
+    (result,) = _run_processes(cluster, [command], timeout=timeout)
+    output = result.stdout.decode(errors="replace")
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, command, output, result.stderr.decode(errors="replace")
+        )
+    return output
+
+
+async def arun_command(cluster: str | None, command: str, timeout: float = 30) -> str:
+    """Runs a command in a new `ssh` / `bash` process, without blocking the event loop.
+
+    Unlike `run_command`, this doesn't need a worker thread, so many commands (on one or more
+    clusters) can be awaited at the same time with `asyncio.gather`. Over SSH, they share the
+    same (multiplexed) connection to each cluster.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command_argv(cluster, command),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except TimeoutError:
+        raise subprocess.TimeoutExpired(command, timeout) from None
+    finally:
+        # Also when the caller is cancelled, so that the process doesn't keep running.
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    output = stdout.decode(errors="replace")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(
+            process.returncode, command, output=output, stderr=stderr.decode(errors="replace")
+        )
+    return output
+
+
+def is_connected(cluster: str | None, deep: bool = False) -> bool:
+    """Checks if there is a live connection to the given cluster.
+
+    By default, this only checks for a running persistent shell or SSH master connection, which
+    doesn't send anything to the cluster. With `deep=True`, a command is run on the cluster.
+    """
+    if deep:
+        try:
+            run_command(cluster, "echo 'connection test'", timeout=10)
+        except (subprocess.SubprocessError, OSError):
+            # This includes the `ConnectionError` of a shell that exits right away.
+            return False
+        return True
+    if is_local(cluster) or ((shell := _shells.get(cluster)) is not None and shell.is_alive):
+        return True
+    # Asks the local master process (if there is one), without contacting the cluster.
+    try:
+        check = subprocess.run(
+            ["ssh", *ssh_options(), "-O", "check", cluster],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=10,
+            check=False,
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        # `OSError` also covers the `FileNotFoundError` when there is no `ssh` binary.
+        return False
+    return check.returncode == 0
+
+
+def run_commands(
+    cluster: str | None, commands: Sequence[str], timeout: float = 30
+) -> list[subprocess.CompletedProcess[str]]:
+    """Runs several shell commands on a cluster in a single round-trip.
+
+    The commands are sent together as one script, with a separator (with the exit code and the
+    stderr of the command) printed after each one, and the output is split back on those
+    separators.
+
+    To run the commands at the same time instead (each in its own `ssh` session), see
+    `slurm_mcp.ring.CommandRing`.
+
+    Returns the output, stderr and exit code of each command. Unlike `run_command`, a command
+    that fails doesn't raise an error nor prevent the others from running.
+    """
+    if not commands:
+        return []
+    # The stderr of each command is kept in a variable (its stdout goes through fd 3), and
+    # printed after the separator.
+    script = "".join(
+        f"{{ __err=$( ( {command}\n) </dev/null 2>&1 1>&3 3>&- ); }} 3>&1; "
+        f"printf '\\n%s:%d\\n%s\\n%s\\n' {_BATCH_SEPARATOR} $? \"$__err\" {_BATCH_END}\n"
+        for command in commands
+    )
+    parts = _BATCH_SEPARATOR_PATTERN.split(run_command(cluster, script, timeout=timeout))
+    # parts is [output_0, exit_code_0, stderr_0, output_1, exit_code_1, stderr_1, ..., ""]
+    return [
+        subprocess.CompletedProcess(
+            command, int(parts[3 * i + 1]), stdout=parts[3 * i], stderr=parts[3 * i + 2]
+        )
+        for i, command in enumerate(commands)
+    ]
+
+
+def _run_processes(
+    cluster: str | None, commands: Sequence[str], timeout: float
+) -> list[subprocess.CompletedProcess[bytes]]:
+    """Starts a new process for each command, and reads all their outputs as they come in.
+
+    The stdout and stderr of all the processes are read at the same time (so none of them can
+    block on a full pipe), into buffers that are only converted to `bytes` once at the end.
+    """
+    processes = [
+        subprocess.Popen(
+            command_argv(cluster, command),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        for command in commands
+    ]
+    outputs = [bytearray() for _ in commands]
+    errors = [bytearray() for _ in commands]
+    deadline = time.monotonic() + timeout
+    try:
+        with selectors.DefaultSelector() as selector:
+            for process, output, error in zip(processes, outputs, errors):
+                assert process.stdout and process.stderr
+                selector.register(process.stdout, selectors.EVENT_READ, output)
+                selector.register(process.stderr, selectors.EVENT_READ, error)
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not (events := selector.select(remaining)):
+                    raise subprocess.TimeoutExpired(list(commands), timeout)
+                for key, _ in events:
+                    if chunk := os.read(key.fd, _CHUNK_SIZE):
+                        key.data.extend(chunk)
+                    else:
+                        selector.unregister(key.fileobj)
+        exit_codes = [
+            process.wait(timeout=max(deadline - time.monotonic(), 0)) for process in processes
+        ]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            for pipe in (process.stdout, process.stderr):
+                if pipe:
+                    pipe.close()
+    return [
+        subprocess.CompletedProcess(command, exit_code, bytes(output), bytes(error))
+        for command, exit_code, output, error in zip(commands, exit_codes, outputs, errors)
+    ]
+
+
+@atexit.register
+def close_shells() -> None:
+    """Closes the persistent shells of all the clusters."""
+    for shell in _shells.values():
+        shell.close()
+    _shells.clear()
@@ -0,0 +1,304 @@
+import asyncio
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from typing import IO
+
+import pytest
+
+from slurm_mcp import ssh_utils
+from slurm_mcp.ssh_utils import PersistentShell, ShellPool
+
+
+@pytest.fixture(scope="module")
+def shell():
+    """A local shell that is shared by the tests of this module.
+
+    The shell restarts itself when a test kills it, so the tests don't need a fresh one each.
+    """
+    shell = PersistentShell(cluster=None)
+    yield shell
+    shell.close()
+
+
+def test_run_returns_output(shell: PersistentShell):
+    assert shell.run("echo hello; echo world") == "hello\nworld\n"
+    # Output that doesn't end with a newline is preserved as-is.
+    assert shell.run("printf abc") == "abc"
+
+
+def test_shell_is_reused(shell: PersistentShell):
+    first_pid = shell.run("echo $$")
+    assert shell.run("echo $$") == first_pid
+
+
+def test_non_zero_exit_code_raises(shell: PersistentShell):
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        shell.run("echo partial; exit 3")
+    assert exc_info.value.returncode == 3
+    assert exc_info.value.output == "partial\n"
+    # The session survives the `exit` in the command.
+    assert shell.is_alive
+    assert shell.run("echo ok") == "ok\n"
+
+
+def test_stderr_is_captured(shell: PersistentShell):
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        shell.run("echo out; echo err >&2; exit 1")
+    assert exc_info.value.output == "out\n"
+    assert exc_info.value.stderr == "err\n"
+    # A lot of stderr (more than what fits in the pipe) doesn't block the command.
+    assert shell.run("head -c 1000000 /dev/zero >&2; echo ok") == "ok\n"
+
+
+def test_output_that_looks_like_the_sentinel(shell: PersistentShell):
+    # Only the sentinel with the unique id of the command ends its output.
+    fake_sentinel = f"{ssh_utils._SENTINEL}{'0' * 32}:0"
+    assert shell.run(f"echo; echo {fake_sentinel}; echo after") == f"\n{fake_sentinel}\nafter\n"
+
+
+class _FakeProcess:
+    """Stands in for the process of a shell, with pipes that the test writes the output to."""
+
+    def __init__(self, stdin: IO[bytes], stdout: IO[bytes], stderr: IO[bytes]):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def poll(self):
+        return None
+
+    def kill(self):
+        pass
+
+    def wait(self):
+        return 0
+
+
+@pytest.fixture
+def fake_process() -> Iterator[tuple[_FakeProcess, int, int]]:
+    """Yields a `_FakeProcess` and the fds to write its stdout and stderr to."""
+    stdout_read, stdout_write = os.pipe()
+    stderr_read, stderr_write = os.pipe()
+    with (
+        open(os.devnull, "wb") as stdin,
+        os.fdopen(stdout_read, "rb", buffering=0) as stdout,
+        os.fdopen(stderr_read, "rb", buffering=0) as stderr,
+    ):
+        try:
+            yield _FakeProcess(stdin, stdout, stderr), stdout_write, stderr_write
+        finally:
+            os.close(stdout_write)
+            os.close(stderr_write)
+
+
+def test_sentinel_split_across_reads(
+    fake_process: tuple[_FakeProcess, int, int], monkeypatch: pytest.MonkeyPatch
+):
+    """Feeds a scripted byte stream to a shell, with the sentinel split over several reads."""
+    monkeypatch.setattr(ssh_utils.uuid, "uuid4", lambda: uuid.UUID(int=0))
+    marker = f"{ssh_utils._SENTINEL}{'0' * 32}".encode()
+    stream = [b"some ", b"output\n", marker[:10], marker[10:] + b":", b"7\n"]
+    process, stdout_write, stderr_write = fake_process
+
+    def _write_stream():
+        os.write(stderr_write, b"some warning\n")
+        for chunk in stream:
+            time.sleep(0.01)
+            os.write(stdout_write, chunk)
+
+    # Not the shared `shell` fixture, since its process is replaced by a fake one.
+    shell = PersistentShell(cluster=None)
+    shell._process = process  # type: ignore
+    writer = threading.Thread(target=_write_stream)
+    writer.start()
+    try:
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            shell.run("some command", timeout=5)
+    finally:
+        writer.join()
+        # The pipes are closed by the fixture.
+        shell._process = None
+    assert exc_info.value.returncode == 7
+    assert exc_info.value.output == "some output"
+    assert exc_info.value.stderr == "some warning\n"
+
+
+def test_timeout_restarts_shell(shell: PersistentShell):
+    with pytest.raises(subprocess.TimeoutExpired):
+        shell.run("sleep 5", timeout=0.2)
+    assert shell.run("echo ok") == "ok\n"
+
+
+def test_restarts_dead_shell(shell: PersistentShell):
+    shell.run("true")
+    assert shell._process is not None
+    shell._process.kill()
+    shell._process.wait()
+    assert shell.run("echo ok") == "ok\n"
+
+
+def test_shell_that_keeps_dying_raises_connection_error(shell: PersistentShell):
+    with pytest.raises(ConnectionError):
+        shell.run("kill -9 $$")
+    assert shell.run("echo ok") == "ok\n"
+
+
+def test_shell_pool_runs_commands_concurrently():
+    pool = ShellPool(cluster=None, size=2)
+    try:
+        # Sequential commands reuse the same shell.
+        assert pool.run("echo $$") == pool.run("echo $$")
+        pids: list[str] = []
+        threads = [
+            threading.Thread(target=lambda: pids.append(pool.run("sleep 0.5; echo $$")))
+            for _ in range(2)
+        ]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - start < 1
+        assert len(set(pids)) == 2
+        assert len(pool._shells) == 2
+    finally:
+        pool.close()
+
+
+def test_get_shell_reuses_the_pool(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ssh_utils, "_shells", {})
+    pool = ssh_utils.get_shell("mila")
+    assert ssh_utils.get_shell("mila") is pool
+    assert ssh_utils.get_shell("other") is not pool
+    # Local commands all share the same pool.
+    assert ssh_utils.get_shell("localhost") is ssh_utils.get_shell(None)
+
+
+def test_run_commands_in_one_round_trip(shell: PersistentShell, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ssh_utils, "get_shell", lambda cluster: shell)
+    pid = shell.run("echo $$")
+
+    results = ssh_utils.run_commands(
+        None, ["echo a", "printf b; echo oops >&2; exit 2", "echo $$; echo warning >&2"]
+    )
+
+    assert [(r.stdout, r.stderr, r.returncode) for r in results] == [
+        ("a\n", "", 0),
+        ("b", "oops", 2),
+        (pid, "warning", 0),
+    ]
+
+
+def test_invalid_utf8_output(shell: PersistentShell):
+    assert shell.run("printf 'abc\\351\\n'") == "abc\ufffd\n"
+    assert ssh_utils.run_command(None, "printf 'abc\\351\\n'", persistent=False) == "abc\ufffd\n"
+
+
+def test_large_output(shell: PersistentShell):
+    output = shell.run("head -c 1000000 /dev/zero | tr '\\0' 'a'")
+    assert output == "a" * 1_000_000
+
+
+def test_run_command_in_new_process():
+    assert ssh_utils.run_command(None, "echo a; echo warning >&2", persistent=False) == "a\n"
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        ssh_utils.run_command(None, "echo a; echo err >&2; exit 3", persistent=False)
+    assert exc_info.value.returncode == 3
+    assert exc_info.value.output == "a\n"
+    assert exc_info.value.stderr == "err\n"
+
+
+def test_persistent_shell_can_be_disabled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ssh_utils, "get_shell", lambda cluster: pytest.fail("Shell was used"))
+    monkeypatch.setenv("SLURM_MCP_PERSISTENT_SHELL", "0")
+    ssh_utils.get_ssh_config.cache_clear()
+    try:
+        assert ssh_utils.run_command(None, "echo ok") == "ok\n"
+    finally:
+        ssh_utils.get_ssh_config.cache_clear()
+
+
+def test_arun_command_gather():
+    async def _run_all():
+        return await asyncio.gather(
+            *(ssh_utils.arun_command(None, f"sleep 0.5; echo {i}") for i in range(10))
+        )
+
+    start = time.monotonic()
+    assert asyncio.run(_run_all()) == [f"{i}\n" for i in range(10)]
+    # Much less than the 5 seconds that they would take one after the other.
+    assert time.monotonic() - start < 2.5
+
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        asyncio.run(ssh_utils.arun_command(None, "echo err >&2; exit 4"))
+    assert exc_info.value.returncode == 4
+    assert exc_info.value.stderr == "err\n"
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(ssh_utils.arun_command(None, "sleep 5", timeout=0.2))
+
+
+def test_cancelled_arun_command_kills_the_process(tmp_path):
+    pid_file = tmp_path / "pid"
+
+    async def _cancel():
+        task = asyncio.create_task(ssh_utils.arun_command(None, f"echo $$ > {pid_file}; sleep 5"))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_cancel())
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_is_connected_handles_errors(monkeypatch: pytest.MonkeyPatch):
+    def _shell_died(cluster, command, timeout=30):
+        raise ConnectionError(f"Shell on cluster {cluster!r} exited unexpectedly.")
+
+    monkeypatch.setattr(ssh_utils, "run_command", _shell_died)
+    assert ssh_utils.is_connected("mila", deep=True) is False
+    # Without an `ssh` binary to ask the master connection.
+    monkeypatch.setenv("PATH", "")
+    assert ssh_utils.is_connected("mila") is False
+
+
+def test_ssh_config_from_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("SLURM_SSH_KEEPALIVE", "5")
+    ssh_utils.get_ssh_config.cache_clear()
+    try:
+        assert ssh_utils.get_ssh_config().keepalive == 5
+        assert "ServerAliveInterval=5" in ssh_utils.command_argv("mila", "squeue")
+        assert ssh_utils.get_ssh_config() is ssh_utils.get_ssh_config()
+    finally:
+        ssh_utils.get_ssh_config.cache_clear()
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("", False), ("0", False), ("false", False), ("1", True), ("yes", True)],
+)
+def test_force_ssh_from_env(monkeypatch: pytest.MonkeyPatch, value: str, expected: bool):
+    monkeypatch.setenv("SLURM_FORCE_SSH", value)
+    ssh_utils.get_ssh_config.cache_clear()
+    try:
+        assert ssh_utils.get_ssh_config().force_ssh is expected
+    finally:
+        ssh_utils.get_ssh_config.cache_clear()
+
+
+def test_localhost_runs_without_ssh(monkeypatch: pytest.MonkeyPatch):
+    assert ssh_utils.command_argv("localhost", "squeue") == ["bash", "-c", "squeue"]
+    assert ssh_utils.command_argv("mila", "squeue")[0] == "ssh"
+
+    monkeypatch.setenv("SLURM_FORCE_SSH", "1")
+    ssh_utils.get_ssh_config.cache_clear()
+    try:
+        assert ssh_utils.command_argv("localhost", "squeue")[0] == "ssh"
+    finally:
+        ssh_utils.get_ssh_config.cache_clear()